@@ -14,6 +14,10 @@ import numpy as np
 from PIL import Image
 from io import BytesIO
 
+# Poster derivative index and markup live with the page generator
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'segment-picker'))
+from poster_derivatives import load_index, poster_html
+
 CDN = "https://d2xbllb3qhv8ay.cloudfront.net"
 
 
@@ -289,6 +293,7 @@ def generate_page(selected_clips):
         }
         .clip img {
             width: 100%;
+            height: auto;
             display: block;
         }
     </style>
@@ -301,13 +306,14 @@ def generate_page(selected_clips):
         <div class="clips-grid">
 ''']
 
+    posters = load_index()
+    onload = 'onload="this.closest(\'.clip\').classList.add(\'loaded\')"'
     for item in selected_clips:
         cid = item['id']
         parts.append(
             f'            <div class="clip" data-id="{cid}" '
             f'data-src="{CDN}/video/{cid}.mp4#t=0.001">'
-            f'<img src="{CDN}/posters/{cid}.jpg" alt="" '
-            f'onload="this.parentNode.classList.add(\'loaded\')">'
+            f'{poster_html(cid, CDN, posters, onload)}'
             f'</div>\n'
         )
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Build low-bitrate HLS proxies of the OBS recordings for the segment picker.
+
+Each recording is transcoded once to H.264/AAC at picker resolution and cut
+into PROXY_SEGMENT-second MPEG-TS segments (proxies/<video_id>/index.m3u8).
+A keyframe is forced at every segment boundary, so any clip starting on a
+multiple of PROXY_SEGMENT (every picker segment) begins on a keyframe. The
+server then answers /video by stream-copying the few proxy segments that
+cover the requested range into fragmented mp4, with no decode or encode.
+Recordings without a current proxy are still transcoded per request.
+
+The proxy records the source size and mtime (proxies/<video_id>/source.json);
+a re-encoded or replaced recording gets a new proxy, and the old one is not
+used for it in the meantime. Run it after generate_thumbnails.py, or leave
+it running in the background while picking:
+
+    python build_proxies.py --workers 2
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from recording_catalog import get_catalog, video_id_for
+
+PROXY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "proxies")
+PROXY_WIDTH = 1920  # the picker's preview width (server.PREVIEW_WIDTH)
+PROXY_SEGMENT = 2  # seconds; divides the picker's 10s segments
+PLAYLIST = "index.m3u8"
+
+
+def proxy_paths(video_path):
+    """(proxy directory, playlist path, source.json path) for a recording."""
+    out_dir = os.path.join(PROXY_DIR, video_id_for(video_path))
+    return out_dir, os.path.join(out_dir, PLAYLIST), os.path.join(out_dir, "source.json")
+
+
+def is_current(video_path):
+    """True if the recording has a finished proxy built from its current contents."""
+    _, playlist, source_json = proxy_paths(video_path)
+    try:
+        with open(source_json) as f:
+            source = json.load(f)
+        st = os.stat(video_path)
+    except (OSError, ValueError):
+        return False
+    return source["size"] == st.st_size and source["mtime"] == st.st_mtime and os.path.exists(playlist)
+
+
+def build_proxy(video_path, threads=None):
+    """Transcode one recording into an HLS proxy. Returns the proxy directory."""
+    out_dir, _, _ = proxy_paths(video_path)
+    st = os.stat(video_path)
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    cmd = [
+        "ffmpeg", "-v", "quiet", "-y", "-i", video_path,
+        "-vf", f"scale={PROXY_WIDTH}:-2",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "26",
+        "-maxrate", "4M", "-bufsize", "8M", "-pix_fmt", "yuv420p",
+        # Keyframe exactly on every segment boundary, none in between from scene cuts
+        "-force_key_frames", f"expr:gte(t,n_forced*{PROXY_SEGMENT})", "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k",
+        "-f", "hls", "-hls_time", str(PROXY_SEGMENT), "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(tmp_dir, "seg_%05d.ts"),
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    subprocess.run(cmd + [os.path.join(tmp_dir, PLAYLIST)], check=True)
+    with open(os.path.join(tmp_dir, "source.json"), "w") as f:
+        json.dump({"path": os.path.abspath(video_path), "size": st.st_size, "mtime": st.st_mtime}, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+
+def read_playlist(playlist):
+    """[(start, duration, segment path)] from a VOD media playlist."""
+    segments = []
+    t = 0.0
+    duration = None
+    with open(playlist) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((t, duration, os.path.join(os.path.dirname(playlist), line)))
+                t += duration
+                duration = None
+    return segments
+
+
+def clip_cmd(video_path, start, duration):
+    """
+    ffmpeg command remuxing [start, start + duration) of the recording's proxy
+    to fragmented mp4 on stdout, or None if there is no current proxy.
+    """
+    if not is_current(video_path):
+        return None
+    start, duration = float(start), float(duration)
+    segments = read_playlist(proxy_paths(video_path)[1])
+    covering = [s for s in segments if s[0] + s[1] > start and s[0] < start + duration]
+    if not covering:
+        return None
+    first_start = covering[0][0]
+    # MPEG-TS segments concatenate byte-wise; seek from the first covering segment
+    return [
+        "ffmpeg", "-v", "quiet",
+        "-ss", f"{start - first_start:.3f}",
+        "-i", "concat:" + "|".join(path for _, _, path in covering),
+        "-t", str(duration),
+        "-c", "copy", "-bsf:a", "aac_adtstoasc",
+        "-movflags", "frag_keyframe+empty_moov",
+        "-f", "mp4", "pipe:1"
+    ]
+
+
+def main(workers=1):
+    catalog = get_catalog()
+    if not os.path.isdir(catalog.obs_dir):
+        sys.exit(f"Recording directory not found: {catalog.obs_dir}")
+    videos = catalog.recordings()
+    todo = [path for path in videos if not is_current(path)]
+    print(f"{len(videos)} recordings, {len(todo)} without a current proxy", flush=True)
+    os.makedirs(PROXY_DIR, exist_ok=True)
+
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    def build(video_path):
+        print(f"Building proxy for {os.path.basename(video_path)}...", flush=True)
+        try:
+            out_dir = build_proxy(video_path, threads)
+        except subprocess.CalledProcessError as e:
+            print(f"  ✗ {video_id_for(video_path)}: ffmpeg exited with {e.returncode}", flush=True)
+            return 0
+        size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+        print(f"  → {video_id_for(video_path)}: {size / (1024 * 1024):.0f} MB", flush=True)
+        return 1
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        built = sum(pool.map(build, todo))
+    print(f"\n{built}/{len(todo)} proxies written to {PROXY_DIR}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1,
+                        help="recordings to transcode concurrently")
+    args = parser.parse_args()
+    main(workers=args.workers)
@@ -1,68 +1,296 @@
 #!/usr/bin/env python3
-"""Group visually similar consecutive segments within each video."""
+"""Group visually similar consecutive segments within each video.
 
-import json
+Features come from the segment thumbnails. When a thumbnail is missing, or with
+--signatures, the frame at the segment midpoint is taken from the signature
+store written by scan_all_loops.py instead.
+
+The downscaled thumbnail pixels of each video are cached in
+features/<video_id>.npz keyed by thumbnail path and mtime, so re-grouping with a
+different --threshold does no image I/O. Normalization and similarities are
+computed on the stacked (segments, features) array.
+
+With --global, near-duplicate segments across recordings are found with
+Euclidean (p-stable) LSH over the same features: only segments sharing a hash
+bucket in some table are compared, buckets too large to compare cheaply are
+split with further hashes, and matches are merged with union-find. Each
+duplicate segment gets dup_group / dup_group_size next to its group fields.
+"""
+
+import argparse
 import os
 import numpy as np
 from PIL import Image
 
+from segment_store import MANIFEST_PATH, export_manifest, get_video, list_videos, open_store, update_segments
+from signature_store import available_signatures, frame_at
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURE_DIR = os.path.join(BASE_DIR, "features")
 SIMILARITY_THRESHOLD = 0.92  # cosine similarity threshold for grouping
+FEATURE_SIZE = (64, 18)  # small, preserves 32:9 ratio
+FEATURE_DIM = FEATURE_SIZE[0] * FEATURE_SIZE[1] * 3
+SIM_BLOCK = 64  # segments compared against a group anchor per step
+DUP_THRESHOLD = 0.97  # cosine similarity for cross-recording duplicates
+LSH_TABLES = 24
+LSH_HASHES = 6  # quantized projections per table key
+LSH_WIDTH = 4.0  # quantization step, in multiples of the match distance
+LSH_MAX_BUCKET = 128  # larger buckets are split with LSH_SPLIT more hashes...
+LSH_SPLIT = 2
+LSH_MAX_HASHES = 32  # ...up to this many per table
+LSH_BLOCK = 4096  # segments hashed per step
 
-def image_features(path):
-    """Extract a compact feature vector from a thumbnail."""
-    img = Image.open(path).resize((64, 18))  # small, preserves 32:9 ratio
-    arr = np.array(img, dtype=np.float32).flatten()
-    # Normalize
-    norm = np.linalg.norm(arr)
-    if norm > 0:
-        arr /= norm
-    return arr
+def pil_pixels(img):
+    """Downscaled RGB pixels of a PIL image as a flat uint8 vector."""
+    return np.asarray(img.convert("RGB").resize(FEATURE_SIZE), dtype=np.uint8).reshape(-1)
 
-def cosine_sim(a, b):
-    return float(np.dot(a, b))
+def normalize(pixels):
+    """Row-wise L2-normalized float32 features from stacked pixel vectors."""
+    feats = pixels.astype(np.float32)
+    norms = np.linalg.norm(feats, axis=1, keepdims=True)
+    np.divide(feats, norms, out=feats, where=norms > 0)
+    return feats
 
-def group_video_segments(video):
-    """Group consecutive similar segments. Returns list of groups."""
-    segments = video["segments"]
-    if not segments:
-        return []
+def load_feature_cache(video_id):
+    """{thumbnail path: (mtime, pixels)} from a video's feature cache."""
+    path = os.path.join(FEATURE_DIR, f"{video_id}.npz")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path) as data:
+            return {p: (m, px) for p, m, px in zip(data["paths"], data["mtimes"], data["pixels"])}
+    except (OSError, ValueError, KeyError):
+        return {}
 
-    # Compute features for each segment
-    features = []
-    for seg in segments:
-        thumb_path = os.path.join(BASE_DIR, seg["thumbnail"])
-        if os.path.exists(thumb_path):
-            features.append(image_features(thumb_path))
+def save_feature_cache(video_id, entries):
+    os.makedirs(FEATURE_DIR, exist_ok=True)
+    path = os.path.join(FEATURE_DIR, f"{video_id}.npz")
+    paths = sorted(entries)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f,
+                 paths=np.array(paths, dtype=str),
+                 mtimes=np.array([entries[p][0] for p in paths], dtype=np.float64),
+                 pixels=np.stack([entries[p][1] for p in paths]).astype(np.uint8))
+    os.replace(tmp, path)
+
+def thumbnail_pixels(video_id, thumb_paths):
+    """
+    Stacked pixel vectors for a video's thumbnails, read from the feature cache
+    where the thumbnail's mtime is unchanged. Returns (pixels, valid) where
+    valid is False for thumbnails that do not exist.
+    """
+    cache = load_feature_cache(video_id)
+    pixels = np.zeros((len(thumb_paths), FEATURE_DIM), dtype=np.uint8)
+    valid = np.zeros(len(thumb_paths), dtype=bool)
+    entries = {}
+    dirty = False
+    for i, thumb_path in enumerate(thumb_paths):
+        try:
+            mtime = os.stat(thumb_path).st_mtime
+        except OSError:
+            continue
+        cached = cache.get(thumb_path)
+        if cached is not None and cached[0] == mtime:
+            px = cached[1]
         else:
-            features.append(None)
+            with Image.open(thumb_path) as img:
+                px = pil_pixels(img)
+            dirty = True
+        entries[thumb_path] = (mtime, px)
+        pixels[i] = px
+        valid[i] = True
+    if dirty or entries.keys() != cache.keys():
+        if entries:
+            save_feature_cache(video_id, entries)
+    return pixels, valid
 
-    # Group consecutive similar segments
+def group_by_anchor(features, valid, threshold=SIMILARITY_THRESHOLD):
+    """
+    Split segments into runs: a run starts at an anchor segment and extends
+    while each following segment has cosine similarity >= threshold to the
+    anchor. Segments without features always start a new run.
+    """
+    n = len(features)
     groups = []
-    current_group = [0]
-    for i in range(1, len(segments)):
-        if features[i] is not None and features[current_group[0]] is not None:
-            sim = cosine_sim(features[current_group[0]], features[i])
-            if sim >= SIMILARITY_THRESHOLD:
-                current_group.append(i)
+    anchor = 0
+    while anchor < n:
+        end = anchor + 1
+        if valid[anchor]:
+            while end < n:
+                block = slice(end, min(end + SIM_BLOCK, n))
+                sims = features[block] @ features[anchor]
+                stops = np.flatnonzero(~(valid[block] & (sims >= threshold)))
+                if len(stops):
+                    end += int(stops[0])
+                    break
+                end = block.stop
+        groups.append(list(range(anchor, end)))
+        anchor = end
+    return groups
+
+def segment_pixels(video, use_signatures=False):
+    """(pixels, valid) for every segment of a video; see thumbnail_pixels()."""
+    segments = video["segments"]
+    stores = available_signatures(video["path"]) if video.get("path") else []
+    fps, _, signatures = stores[0] if stores else (None, None, None)
+
+    thumb_paths = [os.path.join(BASE_DIR, seg["thumbnail"]) for seg in segments]
+    if signatures is not None and use_signatures:
+        pixels = np.zeros((len(segments), FEATURE_DIM), dtype=np.uint8)
+        valid = np.zeros(len(segments), dtype=bool)
+    else:
+        pixels, valid = thumbnail_pixels(video["video_id"], thumb_paths)
+
+    # Signature store frames fill in for missing thumbnails (or replace all with --signatures)
+    if signatures is not None:
+        for i, seg in enumerate(segments):
+            if not valid[i]:
+                mid = (seg["start"] + seg["end"]) / 2
+                frame = np.asarray(frame_at(signatures, fps, mid))
+                pixels[i] = pil_pixels(Image.fromarray(frame))
+                valid[i] = True
+
+    return pixels, valid
+
+def group_video_segments(video, use_signatures=False, threshold=SIMILARITY_THRESHOLD):
+    """Group consecutive similar segments. Returns list of groups."""
+    if not video["segments"]:
+        return []
+    pixels, valid = segment_pixels(video, use_signatures)
+    return group_by_anchor(normalize(pixels), valid, threshold)
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+def mean_feature(pixels):
+    """Mean of the normalized features, computed LSH_BLOCK rows at a time."""
+    total = np.zeros(pixels.shape[1], dtype=np.float64)
+    for lo in range(0, len(pixels), LSH_BLOCK):
+        total += normalize(pixels[lo:lo + LSH_BLOCK]).sum(axis=0)
+    return (total / max(1, len(pixels))).astype(np.float32)
+
+def lsh_codes(pixels, rows, planes, offsets, center, width):
+    """Quantized projections of the centered features of rows: (len(rows), projections) int32."""
+    codes = np.empty((len(rows), planes.shape[1]), dtype=np.int32)
+    for lo in range(0, len(rows), LSH_BLOCK):
+        feats = normalize(pixels[rows[lo:lo + LSH_BLOCK]]) - center
+        codes[lo:lo + LSH_BLOCK] = np.floor((feats @ planes + offsets) / width)
+    return codes
+
+def lsh_buckets(codes, rows, hashes=LSH_HASHES, max_bucket=LSH_MAX_BUCKET):
+    """
+    Buckets (arrays of rows) of one table with at least two rows. codes holds
+    every projection of the table for each row; the key is the first `hashes`
+    of them. A bucket with more than max_bucket rows is re-keyed on the next
+    LSH_SPLIT projections until they run out, which keeps the comparisons per
+    table near-linear in the number of rows.
+    """
+    stack = [(np.arange(len(rows)), 0, hashes)]
+    while stack:
+        members, lo, hi = stack.pop()
+        _, keys = np.unique(codes[members, lo:hi], axis=0, return_inverse=True)
+        keys = keys.ravel()
+        order = np.argsort(keys, kind="stable")
+        for bucket in np.split(members[order], np.flatnonzero(np.diff(keys[order])) + 1):
+            if len(bucket) < 2:
                 continue
-        # Start new group
-        groups.append(current_group)
-        current_group = [i]
-    groups.append(current_group)
+            if len(bucket) > max_bucket and hi < codes.shape[1]:
+                stack.append((bucket, hi, min(hi + LSH_SPLIT, codes.shape[1])))
+            else:
+                yield rows[bucket]
 
-    return groups
+def link_bucket(uf, pixels, owners, bucket, threshold):
+    """Union cross-recording pairs of a bucket at or above threshold, SIM_BLOCK rows at a time."""
+    feats = normalize(pixels[bucket])
+    bucket_owners = owners[bucket]
+    for lo in range(0, len(bucket), SIM_BLOCK):
+        sims = feats[lo:lo + SIM_BLOCK] @ feats.T
+        match = (sims >= threshold) & (bucket_owners[lo:lo + SIM_BLOCK, None] != bucket_owners[None, :])
+        for a, b in zip(*np.nonzero(match)):
+            if lo + a < b:
+                uf.union(bucket[lo + a], bucket[b])
 
-def main():
-    manifest_path = os.path.join(BASE_DIR, "manifest.json")
-    with open(manifest_path) as f:
-        manifest = json.load(f)
+def duplicate_groups(pixels, owners, threshold=DUP_THRESHOLD,
+                     tables=LSH_TABLES, hashes=LSH_HASHES, seed=0, stats=None):
+    """
+    Cross-recording near-duplicate groups among stacked segment pixels.
+
+    owners: recording id per row; only pairs from different recordings are
+    linked (groups can still gather several segments of one recording through
+    transitivity). Cosine similarity >= threshold between unit vectors is
+    Euclidean distance <= sqrt(2 * (1 - threshold)), so the tables hash that
+    distance with quantized random projections of the mean-centered features
+    (centering only spreads the buckets; distances are unchanged). Rows sharing
+    a bucket in any table are confirmed with the exact, uncentered cosine.
+    If stats is a dict, the number of pairs compared is stored in stats["pairs"].
+    Returns a list of row-index lists, each with at least two recordings.
+    """
+    n = len(pixels)
+    if stats is not None:
+        stats["pairs"] = 0
+    if n < 2:
+        return []
+    owners = np.asarray(owners)
+    # Blank thumbnails have no direction and match nothing
+    rows = np.flatnonzero(pixels.any(axis=1))
+    width = LSH_WIDTH * np.sqrt(2 * (1 - threshold))
+    center = mean_feature(pixels[rows])
+    rng = np.random.default_rng(seed)
+    max_hashes = max(hashes, LSH_MAX_HASHES)
+
+    # Every table's projections in one pass, so each row is normalized once
+    planes = rng.standard_normal((pixels.shape[1], tables * max_hashes)).astype(np.float32)
+    offsets = rng.uniform(0, width, tables * max_hashes).astype(np.float32)
+    codes = lsh_codes(pixels, rows, planes, offsets, center, width)
+
+    uf = UnionFind(n)
+    for t in range(tables):
+        table = codes[:, t * max_hashes:(t + 1) * max_hashes]
+        for bucket in lsh_buckets(table, rows, hashes):
+            if len(set(owners[bucket])) < 2:
+                continue
+            if stats is not None:
+                stats["pairs"] += len(bucket) * (len(bucket) - 1) // 2
+            link_bucket(uf, pixels, owners, bucket, threshold)
+
+    members = {}
+    for i in range(n):
+        members.setdefault(uf.find(i), []).append(i)
+    return [m for m in members.values() if len(m) > 1 and len(set(owners[m])) > 1]
+
+def main(use_signatures=False, threshold=SIMILARITY_THRESHOLD, global_dups=False,
+         dup_threshold=DUP_THRESHOLD):
+    conn = open_store()
 
     total_groups = 0
     total_segments = 0
+    videos = []
+    dup_rows = []  # (video position, segment index) of each global feature row
+    dup_pixels = []
 
-    for video in manifest:
-        groups = group_video_segments(video)
+    # One recording at a time; only its segment rows are rewritten
+    for entry in list_videos(conn):
+        video = get_video(conn, entry["video_id"])
+        if not video["segments"]:
+            groups = []
+        else:
+            pixels, valid = segment_pixels(video, use_signatures)
+            groups = group_by_anchor(normalize(pixels), valid, threshold)
         # Add group info to each segment
         for group_idx, group in enumerate(groups):
             for seg_pos, seg_i in enumerate(group):
@@ -72,12 +300,49 @@ def main():
         total_groups += len(groups)
         total_segments += len(video["segments"])
         print(f"{video['video_id']}: {len(video['segments'])} segments → {len(groups)} groups")
+        if global_dups:
+            if groups:
+                dup_rows.extend((len(videos), i) for i in np.flatnonzero(valid))
+                dup_pixels.append(pixels[valid])
+            videos.append(video)
+        else:
+            update_segments(conn, video["video_id"], video["segments"])
+
+    if global_dups:
+        pixels = np.concatenate(dup_pixels) if dup_pixels else np.zeros((0, FEATURE_DIM), np.uint8)
+        stats = {}
+        dups = duplicate_groups(pixels, [v for v, _ in dup_rows], dup_threshold, stats=stats)
+        for video in videos:
+            for seg in video["segments"]:
+                seg.pop("dup_group", None)
+                seg.pop("dup_group_size", None)
+        for dup_idx, rows in enumerate(sorted(dups)):
+            for row in rows:
+                v, i = dup_rows[row]
+                videos[v]["segments"][i]["dup_group"] = dup_idx
+                videos[v]["segments"][i]["dup_group_size"] = len(rows)
+        for video in videos:
+            update_segments(conn, video["video_id"], video["segments"])
+        n = len(pixels)
+        print(f"\n{sum(len(d) for d in dups)} segments in {len(dups)} cross-recording duplicate groups "
+              f"({stats['pairs']} pairs compared, {stats['pairs'] / max(1, n * (n - 1) // 2):.1%} of all)")
 
-    # Save updated manifest
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    export_manifest(conn)
+    conn.close()
 
     print(f"\nTotal: {total_segments} segments → {total_groups} groups")
+    print(f"Manifest written to {MANIFEST_PATH}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--signatures", action="store_true",
+                        help="use frames from the signature store instead of thumbnail files")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="cosine similarity to a group's first segment needed to join it")
+    parser.add_argument("--global", dest="global_dups", action="store_true",
+                        help="also group near-duplicate segments across recordings (dup_group)")
+    parser.add_argument("--dup-threshold", type=float, default=DUP_THRESHOLD,
+                        help="cosine similarity for cross-recording duplicates")
+    args = parser.parse_args()
+    main(use_signatures=args.signatures, threshold=args.threshold,
+         global_dups=args.global_dups, dup_threshold=args.dup_threshold)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Background export jobs for the segment picker server.
+
+POST /export submits a batch of selections and returns a job id at once. The
+cuts (ffmpeg -c copy) run in parallel on an ExportQueue, which journals them in
+exports/export_journal.jsonl, so re-exporting an unchanged selection reuses the
+existing clip. Each job keeps an append-only list of progress events that
+/jobs/<id> streams to the browser as NDJSON while the cuts finish.
+"""
+
+import numbers
+import os
+import secrets
+import subprocess
+import threading
+import time
+
+from export_queue import ExportQueue
+
+MAX_FINISHED_JOBS = 50  # finished jobs kept for /jobs before the oldest are dropped
+
+
+def cut_clip(video_path, start, duration, output_path, threads=None):
+    """Stream-copy video_path[start:start + duration] to output_path."""
+    subprocess.run([
+        "ffmpeg", "-v", "quiet", "-y",
+        "-ss", str(start), "-i", video_path, "-t", str(duration),
+        "-c", "copy", output_path
+    ], check=True)
+
+
+def check_selections(selections):
+    """Raise ValueError unless selections is a list of well-formed clip selections."""
+    if not isinstance(selections, list):
+        raise ValueError("selections must be a list")
+    for sel in selections:
+        if not isinstance(sel, dict):
+            raise ValueError("each selection must be an object")
+        if not isinstance(sel.get("path"), str) or not isinstance(sel.get("video_id"), str):
+            raise ValueError("path and video_id must be strings")
+        # video_id names the output file, so it must stay inside the export directory
+        video_id = sel["video_id"]
+        if not video_id or video_id.startswith(".") or os.path.basename(video_id) != video_id:
+            raise ValueError(f"bad video_id {video_id!r}")
+        if not isinstance(sel.get("index"), int) or isinstance(sel["index"], bool) or sel["index"] < 0:
+            raise ValueError("index must be a non-negative integer")
+        for key in ("start", "duration"):
+            value = sel.get(key)
+            if not isinstance(value, numbers.Real) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"{key} must be a non-negative number")
+
+
+def output_name(sel):
+    return f"{sel['video_id']}_seg{sel['index']:03d}.mp4"
+
+
+class ExportJob:
+    """One submitted batch: its clips, progress counters and event log."""
+
+    def __init__(self, job_id, total):
+        self.job_id = job_id
+        self.total = total
+        self.exported = []
+        self.failed = 0
+        self.created = time.time()
+        self.events = []
+        self._cond = threading.Condition()
+        self._emit({"event": "queued", "job_id": job_id, "total": total})
+        if total == 0:
+            self._finish()
+
+    @property
+    def finished(self):
+        return len(self.exported) + self.failed >= self.total
+
+    def _emit(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _finish(self):
+        self._emit({
+            "event": "done",
+            "exported": self.exported,
+            "failed": self.failed,
+            "elapsed": round(time.time() - self.created, 2),
+        })
+
+    def _clip_done(self, position, sel, out_path, future=None, error=None):
+        """Record one finished clip from its future, or a clip that could not be queued."""
+        event = {
+            "event": "clip",
+            "position": position,
+            "video_id": sel["video_id"],
+            "index": sel["index"],
+            "file": os.path.basename(out_path),
+        }
+        try:
+            if error is not None:
+                raise error
+            record = future.result()
+        except Exception as e:
+            event.update(status="error", error=str(e))
+        else:
+            event.update(
+                status="resumed" if record.get("resumed") else "done",
+                path=out_path,
+                size_mb=record["size_mb"],
+                elapsed=record["elapsed"],
+            )
+        with self._cond:
+            if event["status"] == "error":
+                self.failed += 1
+            else:
+                self.exported.append({"file": event["file"], "path": out_path})
+            event.update(completed=len(self.exported) + self.failed, total=self.total)
+            self._emit(event)
+            if self.finished:
+                self._finish()
+
+    def follow(self):
+        """Yield every event from the start, blocking for new ones until the job is done."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events):
+                    self._cond.wait()
+                new = self.events[i:]
+                i = len(self.events)
+            for event in new:
+                yield event
+                if event["event"] == "done":
+                    return
+
+    def summary(self):
+        with self._cond:
+            return {
+                "job_id": self.job_id,
+                "total": self.total,
+                "exported": len(self.exported),
+                "failed": self.failed,
+                "finished": self.finished,
+                "created": self.created,
+            }
+
+
+class ExportJobs:
+    """Registry of export jobs sharing one ExportQueue of `workers` ffmpeg processes."""
+
+    def __init__(self, export_dir, workers=2):
+        self.export_dir = export_dir
+        os.makedirs(export_dir, exist_ok=True)
+        # Stream copies are I/O bound, so every cut gets a single ffmpeg thread
+        self.queue = ExportQueue(os.path.join(export_dir, "export_journal.jsonl"),
+                                 jobs=workers, threads_per_job=1)
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, selections):
+        """
+        Queue every selection's cut and return the ExportJob tracking them.
+        Raises ValueError (before registering a job) for malformed selections.
+        Selections writing the same output file are queued once.
+        """
+        check_selections(selections)
+        unique = {}
+        for sel in selections:
+            unique.setdefault(output_name(sel), sel)
+        job = ExportJob(secrets.token_hex(6), len(unique))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        for position, (name, sel) in enumerate(unique.items()):
+            out_path = os.path.join(self.export_dir, name)
+            try:
+                future = self.queue.submit(out_path, cut_clip, sel["path"], sel["start"], sel["duration"],
+                                           video_id=sel["video_id"], index=sel["index"])
+            except Exception as e:
+                # e.g. the queue is shutting down; report the clip so the job still finishes
+                job._clip_done(position, sel, out_path, error=e)
+                continue
+            future.add_done_callback(
+                lambda f, position=position, sel=sel, out_path=out_path:
+                    job._clip_done(position, sel, out_path, f))
+        return job
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS. Caller holds the lock."""
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job.job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.summary() for job in jobs]
+
+    def close(self):
+        self.queue.close()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Concurrent export queue with a resume journal.
+
+Export jobs (ffmpeg encodes) run on a small thread pool while the caller keeps
+scanning. Each job gets a fixed ffmpeg thread budget so several encodes can
+share the machine, and every finished job is appended to a JSONL journal.
+A later run with the same journal skips jobs whose output already exists and
+whose arguments are unchanged, so an interrupted batch resumes where it stopped.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ExportQueue:
+    """Run export functions concurrently and journal each finished job."""
+
+    def __init__(self, journal_path, jobs=2, threads_per_job=None):
+        self.journal_path = journal_path
+        self.jobs = max(1, jobs)
+        self.threads_per_job = threads_per_job or max(1, (os.cpu_count() or 1) // self.jobs)
+        self._pool = ThreadPoolExecutor(max_workers=self.jobs)
+        self._lock = threading.Lock()
+        self._history = []
+        self._done = self._load_journal()
+
+    def _load_journal(self):
+        done = {}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted write
+                    self._history.append(record)
+                    done[record["output"]] = record
+        return done
+
+    def _record(self, record):
+        with self._lock:
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._history.append(record)
+            self._done[record["output"]] = record
+
+    def finished(self, output_path, args):
+        """Journal record for a completed job with these arguments, or None."""
+        record = self._done.get(str(output_path))
+        if record and record["args"] == json.loads(json.dumps(args)) and os.path.exists(output_path):
+            return record
+        return None
+
+    def history(self):
+        """Every journaled job record, oldest first, including earlier runs."""
+        with self._lock:
+            return list(self._history)
+
+    def submit(self, output_path, fn, *args, **meta):
+        """
+        Queue fn(*args, output_path, threads=N).
+
+        fn may return a dict, which is merged into the journal record along with
+        meta. Returns a Future resolving to the journal record; jobs already in
+        the journal resolve immediately with "resumed": True.
+        """
+        record = self.finished(output_path, args)
+        if record is not None:
+            future = Future()
+            future.set_result({**record, "resumed": True})
+            return future
+        return self._pool.submit(self._run, str(output_path), fn, args, meta)
+
+    def _run(self, output_path, fn, args, meta):
+        t0 = time.time()
+        extra = fn(*args, output_path, threads=self.threads_per_job) or {}
+        record = {
+            "output": output_path,
+            "args": json.loads(json.dumps(args)),
+            **meta,
+            **extra,
+            "size_mb": round(os.path.getsize(output_path) / (1024 * 1024), 1),
+            "elapsed": round(time.time() - t0, 2),
+        }
+        self._record(record)
+        return record
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
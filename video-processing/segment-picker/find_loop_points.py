@@ -7,16 +7,33 @@ extracts frames around the clip's anchor point, and finds the best start/end
 frame pair where first and last frames are visually similar — making a clean loop.
 
 Outputs new ProRes clips to exports_looped/ directory.
+
+With --refine, the search runs as a cheap coarse scan (COARSE_FPS, COARSE_SCALE)
+and the winning start/end are then snapped to the best pair of native frames.
+
+Exports run on an ExportQueue (export_queue.py), so encoding one clip overlaps
+with searching the next; finished exports are journaled for resume.
+
+With --copy, clips from intra-only sources (every OBS ProRes frame is a
+keyframe) are stream-copied instead of re-encoded, which is lossless and
+frame-accurate; other codecs fall back to the ProRes re-encode. The run ends
+with the speedup of stream copy over re-encoding.
+
+If the signature store (signature_store.py) already holds frames for a recording
+at the scan fps and scale, the search window is read from it instead of decoded.
 """
 
+import argparse
 import json
 import subprocess
 import numpy as np
-import sys
-import os
 from pathlib import Path
 
-OBS_DIR = "/Volumes/Workspace/obs_recordings"
+from export_queue import ExportQueue
+from loop_search import find_loop_candidates, refine_loop
+from recording_catalog import INTRA_CODECS, get_catalog
+from signature_store import load_signatures
+
 EXPORTS_DIR = Path(__file__).parent / "exports_looped"
 SELECTED = Path(__file__).parent / "selected_12.json"
 
@@ -25,58 +42,34 @@ SEARCH_MARGIN = 5  # seconds before/after original start
 MIN_DURATION = 4   # minimum clip length in seconds
 MAX_DURATION = 14  # maximum clip length in seconds
 SAMPLE_FPS = 5     # frames per second to sample for comparison (lower = faster)
+TOP_K = 5          # loop candidates kept per clip for re-ranking
+SCALE = (480, 135)  # analysis size, roughly 1/8 of 3840x1080
+
+# Coarse pass used by --refine; the native-rate pass fixes the precision.
+# Matches scan_all_loops so the coarse pass can read its signature store.
+COARSE_FPS = 3
+COARSE_SCALE = (240, 68)
 
 
 def get_source_path(video_id):
     """Map video_id like '2026-02-07_19-39-37' back to OBS recording path."""
-    # Convert underscore format back to space format
-    name = video_id.replace("_", " ", 1).replace("_", " ", 1).replace("-", "-")
-    # Try both .mov patterns
-    for f in Path(OBS_DIR).glob("*.mov"):
-        normalized = f.stem.replace(" ", "_").replace("_", "_")
-        if video_id == normalized or video_id == f.stem.replace(" ", "_"):
-            return str(f)
-    # Direct name match
-    candidate = Path(OBS_DIR) / f"{video_id.replace('_', ' ', 2)}.mov"
-    if candidate.exists():
-        return str(candidate)
-    # Try replacing first two underscores with spaces
-    parts = video_id.split("_")
-    if len(parts) >= 3:
-        candidate = Path(OBS_DIR) / f"{parts[0]} {parts[1]} {parts[2]}.mov"
-        if candidate.exists():
-            return str(candidate)
-    # Fallback: match by date prefix
-    date_part = video_id[:10]  # e.g. 2026-02-07
-    time_part = video_id[11:]  # e.g. 19-39-37
-    candidate = Path(OBS_DIR) / f"{date_part} {time_part}.mov"
-    if candidate.exists():
-        return str(candidate)
-    return None
+    return get_catalog().resolve(video_id)
 
 
 def get_video_duration(path):
     """Get video duration in seconds."""
-    result = subprocess.run(
-        ["ffprobe", "-v", "quiet", "-show_entries", "format=duration",
-         "-of", "csv=p=0", path],
-        capture_output=True, text=True
-    )
-    return float(result.stdout.strip())
+    return get_catalog().info(path)["duration"]
 
 
-def extract_frames_as_array(video_path, start_time, duration, fps=SAMPLE_FPS):
-    """Extract frames from video as numpy arrays using ffmpeg pipe."""
-    # First get video dimensions
-    result = subprocess.run(
-        ["ffprobe", "-v", "quiet", "-select_streams", "v:0",
-         "-show_entries", "stream=width,height", "-of", "csv=p=0", video_path],
-        capture_output=True, text=True
-    )
-    w, h = map(int, result.stdout.strip().split(","))
+def get_video_codec(path):
+    """Codec name of the first video stream, e.g. 'prores'."""
+    return get_catalog().info(path)["codec"]
+
 
+def extract_frames_as_array(video_path, start_time, duration, fps=SAMPLE_FPS, scale=SCALE):
+    """Extract frames from video as numpy arrays using ffmpeg pipe."""
     # Scale down for faster comparison
-    scale_w, scale_h = 480, 135  # roughly 1/8 of 3840x1080
+    scale_w, scale_h = scale
 
     cmd = [
         "ffmpeg", "-v", "quiet",
@@ -101,46 +94,7 @@ def extract_frames_as_array(video_path, start_time, duration, fps=SAMPLE_FPS):
     return frames, n_frames
 
 
-def frame_difference(frame_a, frame_b):
-    """Mean absolute difference between two frames, normalized 0-1."""
-    return np.mean(np.abs(frame_a.astype(float) - frame_b.astype(float))) / 255.0
-
-
-def find_best_loop(frames, fps, min_dur, max_dur):
-    """
-    Find the best (start_frame, end_frame) pair where:
-    - duration is between min_dur and max_dur
-    - frame at start and frame at end are most similar
-    Returns (start_idx, end_idx, score)
-    """
-    n = len(frames)
-    min_frames = int(min_dur * fps)
-    max_frames = min(int(max_dur * fps), n - 1)
-
-    best_score = float('inf')
-    best_start = 0
-    best_end = n - 1
-
-    # Try all valid start/end combinations
-    # Start can be in the first quarter, end in the last quarter
-    start_range = max(1, n // 4)
-    end_range = max(1, n // 4)
-
-    for start_idx in range(0, start_range):
-        for end_idx in range(n - end_range, n):
-            span = end_idx - start_idx
-            if span < min_frames or span > max_frames:
-                continue
-            score = frame_difference(frames[start_idx], frames[end_idx])
-            if score < best_score:
-                best_score = score
-                best_start = start_idx
-                best_end = end_idx
-
-    return best_start, best_end, best_score
-
-
-def export_prores(source_path, start_time, duration, output_path):
+def export_prores(source_path, start_time, duration, output_path, threads=None):
     """Export a segment as ProRes 422."""
     cmd = [
         "ffmpeg", "-y", "-v", "quiet",
@@ -151,12 +105,61 @@ def export_prores(source_path, start_time, duration, output_path):
         "-profile:v", "2",  # ProRes 422 Normal
         "-pix_fmt", "yuv422p10le",
         "-an",  # no audio
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    subprocess.run(cmd + [output_path], check=True)
+
+
+def stream_copy(source_path, start_time, duration, output_path):
+    """Cut a segment without re-encoding. Frame-accurate only for intra-only codecs."""
+    cmd = [
+        "ffmpeg", "-y", "-v", "quiet",
+        "-ss", str(start_time),
+        "-i", source_path,
+        "-t", str(duration),
+        "-map", "0:v:0",
+        "-c:v", "copy",
+        "-an",
         output_path
     ]
     subprocess.run(cmd, check=True)
 
 
-def main():
+def export_loop_clip(source_path, start_time, duration, copy, output_path, threads=None):
+    """Stream-copy when asked and the source is intra-only, else re-encode to ProRes."""
+    if copy and get_video_codec(source_path) in INTRA_CODECS:
+        stream_copy(source_path, start_time, duration, output_path)
+        return {"mode": "copy", "duration": duration}
+    export_prores(source_path, start_time, duration, output_path, threads)
+    return {"mode": "encode", "duration": duration}
+
+
+def report_speedup(records, history):
+    """Print seconds of footage exported per wall-clock second, per mode."""
+    def rate(recs):
+        footage = sum(r["duration"] for r in recs)
+        elapsed = sum(r["elapsed"] for r in recs)
+        return footage / elapsed if elapsed > 0 else None
+
+    copied = [r for r in records if r.get("mode") == "copy"]
+    encoded = [r for r in records if r.get("mode") == "encode"]
+    if not encoded:
+        # Compare against re-encodes journaled by earlier runs
+        encoded = [r for r in history if r.get("mode") == "encode"]
+
+    copy_rate, encode_rate = rate(copied), rate(encoded)
+    if copy_rate:
+        print(f"  Stream copy: {len(copied)} clips at {copy_rate:.1f}x realtime")
+    if encode_rate:
+        print(f"  Re-encode:   {len(encoded)} clips at {encode_rate:.1f}x realtime")
+    if copy_rate and encode_rate:
+        print(f"  Speedup: {copy_rate / encode_rate:.1f}x faster with stream copy")
+
+
+def main(refine=False, export_jobs=2, copy=False):
+    fps, scale = (COARSE_FPS, COARSE_SCALE) if refine else (SAMPLE_FPS, SCALE)
+
     with open(SELECTED) as f:
         clips = json.load(f)
 
@@ -164,10 +167,14 @@ def main():
 
     print(f"Processing {len(clips)} clips...")
     print(f"Search margin: ±{SEARCH_MARGIN}s, Duration range: {MIN_DURATION}-{MAX_DURATION}s")
+    if refine:
+        print(f"Coarse scan at {fps}fps {scale[0]}x{scale[1]}, refined at native frame rate")
     print(f"Output: {EXPORTS_DIR}")
     print()
 
     results = []
+    queue = ExportQueue(EXPORTS_DIR / "export_journal.jsonl", export_jobs)
+    exports = []
 
     for i, clip in enumerate(clips):
         video_id = clip["video_id"]
@@ -193,37 +200,60 @@ def main():
 
         print(f"  Searching: {search_start:.1f}s - {search_end:.1f}s ({search_duration:.1f}s window)")
 
-        # Extract frames for the search window
-        frames, n_frames = extract_frames_as_array(
-            source_path, search_start, search_duration, SAMPLE_FPS
-        )
-
-        if n_frames < SAMPLE_FPS * MIN_DURATION:
+        # Extract frames for the search window, from the signature store if possible
+        signatures = load_signatures(source_path, fps, scale)
+        if signatures is not None:
+            first = int(round(search_start * fps))
+            search_start = first / fps
+            frames = np.asarray(signatures[first:int(search_end * fps) + 1])
+            n_frames = len(frames)
+            print(f"  Read {n_frames} frames from signature store")
+        else:
+            frames, n_frames = extract_frames_as_array(
+                source_path, search_start, search_duration, fps, scale
+            )
+
+        if n_frames < fps * MIN_DURATION:
             print(f"  ERROR: Not enough frames ({n_frames})")
             continue
 
-        # Find best loop points
-        start_idx, end_idx, score = find_best_loop(
-            frames, SAMPLE_FPS, MIN_DURATION, MAX_DURATION
+        # Find best loop points, keeping the runners-up for re-ranking
+        loops = find_loop_candidates(
+            frames, fps, MIN_DURATION, MAX_DURATION, k=TOP_K
         )
+        if not loops:
+            print(f"  ERROR: No start/end pair within {MIN_DURATION}-{MAX_DURATION}s")
+            continue
+        start_idx, end_idx, score = loops[0]
 
         # Convert frame indices back to absolute times
-        loop_start = search_start + (start_idx / SAMPLE_FPS)
-        loop_end = search_start + (end_idx / SAMPLE_FPS)
+        loop_start = search_start + (start_idx / fps)
+        loop_end = search_start + (end_idx / fps)
         loop_duration = loop_end - loop_start
 
         print(f"  Best loop: {loop_start:.2f}s - {loop_end:.2f}s ({loop_duration:.2f}s), score={score:.4f}")
 
+        coarse_score = score
+        if refine:
+            loop_start, loop_end, fine_score = refine_loop(
+                source_path, loop_start, loop_end, fps, MIN_DURATION, MAX_DURATION, SCALE,
+                native_fps=get_catalog().info(source_path)["fps"]
+            )
+            if fine_score is not None:
+                score = fine_score
+            loop_duration = loop_end - loop_start
+            print(f"  Refined:   {loop_start:.3f}s - {loop_end:.3f}s ({loop_duration:.3f}s), score={score:.4f}")
+
         # Export as ProRes
         output_name = f"{video_id}_seg{seg_index:03d}_loop.mov"
         output_path = str(EXPORTS_DIR / output_name)
-        export_prores(source_path, loop_start, loop_duration, output_path)
-
-        file_size = os.path.getsize(output_path) / (1024 * 1024)
-        print(f"  Exported: {output_name} ({file_size:.1f}MB)")
+        exports.append((output_name, queue.submit(
+            output_path, export_loop_clip, source_path, loop_start, loop_duration, copy
+        )))
+        print(f"  Queued export: {output_name}")
         print()
 
-        results.append({
+        result = {
             "video_id": video_id,
             "seg_index": seg_index,
             "vimeo_id": vimeo_id,
@@ -233,8 +263,30 @@ def main():
             "loop_end": round(loop_end, 3),
             "loop_duration": round(loop_duration, 3),
             "loop_score": round(score, 6),
+            "alternates": [
+                {
+                    "loop_start": round(search_start + a / fps, 3),
+                    "loop_end": round(search_start + b / fps, 3),
+                    "loop_score": round(sc, 6),
+                }
+                for a, b, sc in loops[1:]
+            ],
             "output_file": output_name
-        })
+        }
+        if refine:
+            result["coarse_score"] = round(coarse_score, 6)
+        results.append(result)
+
+    print(f"Waiting for {len(exports)} exports...")
+    finished = []
+    with queue:
+        for output_name, future in exports:
+            record = future.result()
+            note = " (already exported)" if record.get("resumed") else f" [{record.get('mode', 'encode')}]"
+            print(f"  Exported: {output_name} ({record['size_mb']:.1f}MB){note}")
+            if not record.get("resumed"):
+                finished.append(record)
+    report_speedup(finished, queue.history())
 
     # Save results
     results_path = EXPORTS_DIR / "loop_results.json"
@@ -251,4 +303,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--refine", action="store_true",
+                        help="coarse scan, then snap loop points at native frame rate")
+    parser.add_argument("--export-jobs", type=int, default=2,
+                        help="ProRes exports to run at once")
+    parser.add_argument("--copy", action="store_true",
+                        help="stream-copy intra-only sources instead of re-encoding")
+    args = parser.parse_args()
+    main(refine=args.refine, export_jobs=args.export_jobs, copy=args.copy)
@@ -1,22 +1,104 @@
 #!/usr/bin/env python3
-"""Generate thumbnails for every 10s segment of each video."""
+"""Generate thumbnails for every 10s segment of each video.
 
+The segment store is updated incrementally: only recordings that are new or
+whose size/mtime changed are processed (in a worker pool with --workers), and
+only their rows are rewritten. Group annotations written by
+cluster_segments.py are kept. manifest.json is re-exported from the store.
+
+Missing thumbnails for a recording are extracted by one ffmpeg process rather
+than one seeking process per segment: intra-only recordings (ProRes, DNxHD)
+seek to each wanted frame through a concat list, decoding one frame per
+thumbnail, and long-GOP ones are decoded once with a select filter. Existing
+thumbnails are skipped.
+
+Each recording also gets a sprite sheet (thumbnails/<video_id>/sprite.jpg)
+with every thumbnail as a tile, so the picker loads one image per video. The
+sheet layout is stored on the video ("sprite") and each segment's tile
+position on the segment ("tile": [column, row]).
+"""
+
+import argparse
+import math
 import subprocess
-import json
 import os
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from recording_catalog import INTRA_CODECS, frame_concat_list, get_catalog, video_id_for
+from segment_store import MANIFEST_PATH, export_manifest, get_video, list_videos, open_store, set_order, write_video
 
-VIDEO_DIR = "/Volumes/Workspace/obs_recordings"
 THUMB_DIR = os.path.join(os.path.dirname(__file__), "thumbnails")
 SEGMENT_DURATION = 10
 THUMB_WIDTH = 480  # half of 960, keeps SBS readable
+SINGLE_PASS_MIN = 8  # fewer missing long-GOP thumbnails than this are extracted by seeking
+SPRITE_TILE_WIDTH = 320  # sprite tiles are shown at >= 280px in the picker grid
+SPRITE_COLUMNS = 10
 
 def get_duration(path):
-    result = subprocess.run(
-        ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", path],
-        capture_output=True, text=True
-    )
-    return float(json.loads(result.stdout)["format"]["duration"])
+    return get_catalog().info(path)["duration"]
+
+def extract_thumbnail(video_path, t, thumb_path):
+    """Seek to t and write one thumbnail."""
+    subprocess.run([
+        "ffmpeg", "-v", "quiet", "-ss", str(t),
+        "-i", video_path, "-frames:v", "1",
+        "-vf", f"scale={THUMB_WIDTH}:-1",
+        "-q:v", "4", thumb_path
+    ])
+
+
+def extract_thumbnails_single_pass(video_path, wanted):
+    """Write many thumbnails from one ffmpeg process.
+
+    wanted: list of (time, thumb_path). Each thumbnail is the frame a
+    per-thumbnail seek would have landed on. On an intra-only source a concat
+    list seeks to each of those frames and decodes only them; otherwise a
+    select filter keeps them from one decode starting at the first wanted
+    frame. Returns the thumb_paths that could not be written.
+    """
+    info = get_catalog().info(video_path)
+    fps = info["fps"]
+    if not fps:
+        return [thumb_path for _, thumb_path in wanted]
+    wanted = sorted(wanted)
+    # -ss t lands on the first frame at or after t
+    frames = [math.ceil(t * fps - 1e-6) for t, _ in wanted]
+    unique = sorted(set(frames))
+
+    with tempfile.TemporaryDirectory(dir=THUMB_DIR) as tmp:
+        output = ["-q:v", "4", "-start_number", "0", os.path.join(tmp, "%05d.jpg")]
+        if info["codec"] in INTRA_CODECS:
+            subprocess.run([
+                "ffmpeg", "-v", "quiet",
+                "-f", "concat", "-safe", "0", "-protocol_whitelist", "file,pipe", "-i", "pipe:0",
+                "-an", "-vf", f"scale={THUMB_WIDTH}:-1", "-fps_mode", "passthrough",
+                *output
+            ], input=frame_concat_list(video_path, unique, fps).encode())
+        else:
+            first = unique[0]
+            expr = "+".join(f"eq(n,{n - first})" for n in unique)
+            subprocess.run([
+                "ffmpeg", "-v", "quiet",
+                "-ss", str(max(0.0, (first - 0.5) / fps)),
+                "-i", video_path,
+                "-vf", f"select='{expr}',scale={THUMB_WIDTH}:-1",
+                "-fps_mode", "passthrough",
+                *output
+            ])
+        order = {n: k for k, n in enumerate(unique)}
+        missing = []
+        for n, (_, thumb_path) in zip(frames, wanted):
+            out = os.path.join(tmp, f"{order[n]:05d}.jpg")
+            if os.path.exists(out):
+                os.replace(out, thumb_path)
+            else:
+                missing.append(thumb_path)
+    return missing
+
 
 def generate_thumbnails(video_path, video_id):
     duration = get_duration(video_path)
@@ -24,6 +106,7 @@ def generate_thumbnails(video_path, video_id):
     os.makedirs(out_dir, exist_ok=True)
 
     segments = []
+    wanted = []
     t = 0
     idx = 0
     while t < duration:
@@ -32,12 +115,7 @@ def generate_thumbnails(video_path, video_id):
         thumb_path = os.path.join(out_dir, f"{idx:03d}.jpg")
 
         if not os.path.exists(thumb_path):
-            subprocess.run([
-                "ffmpeg", "-v", "quiet", "-ss", str(mid),
-                "-i", video_path, "-frames:v", "1",
-                "-vf", f"scale={THUMB_WIDTH}:-1",
-                "-q:v", "4", thumb_path
-            ])
+            wanted.append((mid, thumb_path))
 
         segments.append({
             "index": idx,
@@ -49,25 +127,146 @@ def generate_thumbnails(video_path, video_id):
         t += SEGMENT_DURATION
         idx += 1
 
+    # Intra-only sources seek per frame inside one process, so batching always
+    # pays; elsewhere a few scattered thumbnails are cheaper to seek to than a
+    # full decode
+    intra = get_catalog().info(video_path)["codec"] in INTRA_CODECS
+    if wanted and (intra or len(wanted) >= SINGLE_PASS_MIN):
+        missing = set(extract_thumbnails_single_pass(video_path, wanted))
+        wanted = [(mid, path) for mid, path in wanted if path in missing]
+    for mid, thumb_path in wanted:
+        extract_thumbnail(video_path, mid, thumb_path)
+
     return {"video_id": video_id, "path": video_path, "duration": round(duration, 2), "segments": segments}
 
-def main():
-    videos = sorted(f for f in os.listdir(VIDEO_DIR) if f.endswith(".mov"))
-    manifest = []
 
-    for filename in videos:
-        video_id = filename.replace(" ", "_").replace(".mov", "")
-        video_path = os.path.join(VIDEO_DIR, filename)
-        print(f"Processing {filename}...", flush=True)
-        info = generate_thumbnails(video_path, video_id)
-        manifest.append(info)
-        print(f"  → {len(info['segments'])} segments", flush=True)
+def build_sprite(video_id, segments):
+    """
+    Tile a recording's thumbnails into one JPEG sprite sheet.
+
+    Returns the sprite layout for the manifest and sets seg["tile"] on each
+    segment. The sheet is rebuilt only when a thumbnail is newer than it or
+    the segment count changed. Returns None if there are no thumbnails.
+    """
+    thumb_paths = [os.path.join(os.path.dirname(THUMB_DIR), seg["thumbnail"]) for seg in segments]
+    existing = [p for p in thumb_paths if os.path.exists(p)]
+    if not existing:
+        return None
+    with Image.open(existing[0]) as first:
+        tile_w = SPRITE_TILE_WIDTH
+        tile_h = round(first.height * tile_w / first.width)
+    columns = SPRITE_COLUMNS
+    rows = math.ceil(len(segments) / columns)
+    rel_path = f"thumbnails/{video_id}/sprite.jpg"
+    sprite_path = os.path.join(THUMB_DIR, video_id, "sprite.jpg")
+    sprite = {
+        "path": rel_path,
+        "tile_width": tile_w,
+        "tile_height": tile_h,
+        "columns": columns,
+        "rows": rows,
+        "count": len(segments),
+    }
+
+    for i, seg in enumerate(segments):
+        seg["tile"] = [i % columns, i // columns]
+
+    if os.path.exists(sprite_path):
+        sprite_mtime = os.path.getmtime(sprite_path)
+        with Image.open(sprite_path) as old:
+            same_size = old.size == (columns * tile_w, rows * tile_h)
+        if same_size and all(os.path.getmtime(p) <= sprite_mtime for p in existing):
+            sprite["version"] = os.stat(sprite_path).st_mtime_ns
+            return sprite
+
+    sheet = Image.new("RGB", (columns * tile_w, rows * tile_h))
+    for i, thumb_path in enumerate(thumb_paths):
+        if not os.path.exists(thumb_path):
+            continue
+        with Image.open(thumb_path) as img:
+            tile = img.convert("RGB").resize((tile_w, tile_h), Image.LANCZOS)
+        sheet.paste(tile, ((i % columns) * tile_w, (i // columns) * tile_h))
+    tmp_path = sprite_path + ".tmp"
+    sheet.save(tmp_path, "JPEG", quality=82, optimize=True, progressive=True)
+    os.replace(tmp_path, sprite_path)
+    # Cache-busting token: the server marks ?v=<version> sprite URLs immutable
+    sprite["version"] = os.stat(sprite_path).st_mtime_ns
+    return sprite
+
+
+def process_recording(video_path):
+    """Worker entry point: thumbnails and manifest entry for one recording."""
+    video_id = video_id_for(video_path)
+    print(f"Processing {os.path.basename(video_path)}...", flush=True)
+    info = generate_thumbnails(video_path, video_id)
+    sprite = build_sprite(video_id, info["segments"])
+    if sprite:
+        info["sprite"] = sprite
+    st = os.stat(video_path)
+    info["size"] = st.st_size
+    info["mtime"] = st.st_mtime
+    print(f"  → {video_id}: {len(info['segments'])} segments", flush=True)
+    return info
+
+def carry_annotations(old, new):
+    """Copy cluster_segments annotations onto regenerated segments with the same index and start."""
+    old_segments = {(seg["index"], seg["start"]): seg for seg in old["segments"]}
+    for seg in new["segments"]:
+        prev = old_segments.get((seg["index"], seg["start"]))
+        if prev:
+            for key, value in prev.items():
+                if key not in seg:
+                    seg[key] = value
+
+def main(workers=1, full=False):
+    conn = open_store()
+    existing = {} if full else {v["video_id"]: v for v in list_videos(conn)}
+
+    catalog = get_catalog()
+    if not os.path.isdir(catalog.obs_dir):
+        sys.exit(f"Recording directory not found: {catalog.obs_dir}")
+    videos = catalog.recordings()
+
+    # Only new recordings, or ones whose size/mtime changed, need processing
+    changed = []
+    for video_path in videos:
+        old = existing.get(video_id_for(video_path))
+        st = os.stat(video_path)
+        if (old and old.get("size") == st.st_size and old.get("mtime") == st.st_mtime
+                and "sprite" in old):
+            continue
+        catalog.info(video_path)  # probe here so workers read the catalog cache
+        changed.append(video_path)
+
+    print(f"{len(videos)} recordings, {len(changed)} new or changed", flush=True)
+
+    def store(info):
+        old = None if full else get_video(conn, info["video_id"])
+        if old is not None:
+            carry_annotations(old, info)
+        write_video(conn, info)
+
+    if workers > 1 and len(changed) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(changed))) as pool:
+            for info in pool.map(process_recording, changed):
+                store(info)
+    else:
+        for video_path in changed:
+            store(process_recording(video_path))
 
-    manifest_path = os.path.join(os.path.dirname(__file__), "manifest.json")
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
-    print(f"\nManifest written to {manifest_path}")
-    print(f"Total: {sum(len(v['segments']) for v in manifest)} segments across {len(manifest)} videos")
+    # Follow the recording order; drop recordings that no longer exist
+    set_order(conn, [video_id_for(p) for p in videos])
+    export_manifest(conn)
+    total = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+    conn.close()
+    print(f"\nManifest written to {MANIFEST_PATH}")
+    print(f"Total: {total} segments across {len(videos)} videos")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1,
+                        help="recordings to process concurrently")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every manifest entry instead of only new or changed recordings")
+    args = parser.parse_args()
+    main(workers=args.workers, full=args.full)
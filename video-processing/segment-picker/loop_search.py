@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Batched loop-point search.
+
+Computes the mean absolute difference between every candidate start frame and
+every candidate end frame in one pass, working in uint8 blocks under a memory
+cap instead of upcasting frame pairs to float one at a time.
+
+Also provides coarse-to-fine refinement: after a low-fps scan picks a loop,
+refine_loop() decodes only a short window around the chosen start and end at
+the source frame rate and snaps the cut to the best native frame pair.
+"""
+
+import subprocess
+
+import numpy as np
+
+from recording_catalog import get_catalog
+
+MAX_BLOCK_BYTES = 64 * 1024 * 1024  # cap on the uint8 working block per pass
+REFINE_SCALE = (480, 135)  # analysis size for the native-rate refinement pass
+MIN_SEPARATION = 1.0  # seconds; alternate loops must move the start or end this far
+
+
+def pair_distances(starts, ends, max_bytes=MAX_BLOCK_BYTES):
+    """
+    Mean absolute difference between each start and each end frame, normalized 0-1.
+
+    starts: (S, ...) uint8 frames, ends: (E, ...) uint8 frames of the same shape.
+    Returns an (S, E) float64 array.
+    """
+    a = np.ascontiguousarray(starts).reshape(len(starts), -1)
+    b = np.ascontiguousarray(ends).reshape(len(ends), -1)
+    n_starts, n_pixels = a.shape
+    n_ends = len(b)
+    out = np.empty((n_starts, n_ends), dtype=np.float64)
+    if n_starts == 0 or n_ends == 0:
+        return out
+
+    # |a - b| in uint8 as max(a, b) - min(a, b) needs two block-sized buffers
+    cols = max(1, min(n_ends, max_bytes // (2 * n_pixels)))
+    rows = max(1, max_bytes // (2 * n_pixels * cols))
+    norm = n_pixels * 255.0
+
+    for ci in range(0, n_ends, cols):
+        eb = b[None, ci:ci + cols]
+        for ri in range(0, n_starts, rows):
+            sb = a[ri:ri + rows, None]
+            diff = np.maximum(sb, eb)
+            diff -= np.minimum(sb, eb)
+            out[ri:ri + rows, ci:ci + cols] = diff.sum(axis=2, dtype=np.uint64) / norm
+    return out
+
+
+def top_loop_pairs(dist, start_indices, end_indices, min_span, max_span, k=1, min_separation=0):
+    """
+    Pick the k lowest-scoring (start, end) pairs from a distance block.
+
+    start_indices/end_indices give the frame index of each row/column of dist.
+    Pairs whose span falls outside [min_span, max_span] are ignored, and so is
+    any pair whose start and end both lie within min_separation frames of a
+    better pair already picked (non-max suppression), so the runners-up are
+    distinct loops rather than the winner shifted by a frame.
+    Returns a list of (start_idx, end_idx, score), best first. Ties keep
+    start-major order, matching a nested start/end loop.
+    """
+    start_indices = np.asarray(start_indices)
+    end_indices = np.asarray(end_indices)
+    span = end_indices[None, :] - start_indices[:, None]
+    scores = np.where((span >= min_span) & (span <= max_span), dist, np.inf).ravel()
+
+    idx = np.flatnonzero(np.isfinite(scores))
+    if k <= 0 or len(idx) == 0:
+        return []
+    idx = idx[np.lexsort((idx, scores[idx]))]
+
+    n_ends = len(end_indices)
+    picked = []
+    for i in idx:
+        start, end = int(start_indices[i // n_ends]), int(end_indices[i % n_ends])
+        if any(abs(start - s) < min_separation and abs(end - e) < min_separation
+               for s, e, _ in picked):
+            continue
+        picked.append((start, end, float(scores[i])))
+        if len(picked) == k:
+            break
+    return picked
+
+
+def find_loop_candidates(frames, fps, min_dur, max_dur, k=1, max_bytes=MAX_BLOCK_BYTES,
+                         min_separation=MIN_SEPARATION):
+    """
+    Find the k best (start_frame, end_frame) pairs in a window of frames where:
+    - start lies in the first quarter and end in the last quarter
+    - duration is between min_dur and max_dur
+    - no two pairs are within min_separation seconds at both start and end
+    Returns a list of (start_idx, end_idx, score), best first.
+    """
+    n = len(frames)
+    min_frames = int(min_dur * fps)
+    max_frames = min(int(max_dur * fps), n - 1)
+
+    start_range = max(1, n // 4)
+    end_range = max(1, n // 4)
+    start_indices = np.arange(0, start_range)
+    end_indices = np.arange(n - end_range, n)
+
+    dist = pair_distances(frames[:start_range], frames[n - end_range:], max_bytes)
+    return top_loop_pairs(dist, start_indices, end_indices, min_frames, max_frames, k,
+                          min_separation=max(1, round(min_separation * fps)))
+
+
+def get_frame_rate(path):
+    """Native frame rate of the first video stream, in frames per second."""
+    return get_catalog().info(path)["fps"]
+
+
+def decode_frames(video_path, start, duration, scale, fps=None):
+    """Decode a time range to a (n, h, w, 3) uint8 array. fps=None keeps every source frame."""
+    scale_w, scale_h = scale
+    vf = f"scale={scale_w}:{scale_h}"
+    if fps is not None:
+        vf = f"fps={fps}," + vf
+    cmd = [
+        "ffmpeg", "-v", "quiet",
+        "-ss", str(start), "-t", str(duration),
+        "-i", video_path,
+        "-vf", vf,
+        "-pix_fmt", "rgb24", "-f", "rawvideo", "pipe:1"
+    ]
+    raw = subprocess.run(cmd, capture_output=True).stdout
+    frame_size = scale_w * scale_h * 3
+    n_frames = len(raw) // frame_size
+    frames = np.frombuffer(raw[:n_frames * frame_size], dtype=np.uint8)
+    return frames.reshape(n_frames, scale_h, scale_w, 3)
+
+
+def refine_loop(video_path, loop_start, loop_end, coarse_fps, min_dur, max_dur,
+                scale=REFINE_SCALE, native_fps=None):
+    """
+    Snap a coarse loop to the best frame pair at the source frame rate.
+
+    Decodes only ±1 coarse sample period around loop_start and loop_end.
+    Returns (start_time, end_time, score); if no native pair satisfies the
+    duration limits the coarse loop is returned with score None.
+    """
+    if native_fps is None:
+        native_fps = get_frame_rate(video_path)
+    margin = 1.0 / coarse_fps
+
+    def window(center):
+        # Align to the source frame grid; seek half a frame early so rounding
+        # never drops the first frame of the window.
+        first = max(0, int((center - margin) * native_fps))
+        count = int(2 * margin * native_fps) + 1
+        seek = max(0.0, (first - 0.5) / native_fps)
+        frames = decode_frames(video_path, seek, count / native_fps, scale)
+        return frames, (first + np.arange(len(frames))) / native_fps
+
+    starts, start_times = window(loop_start)
+    ends, end_times = window(loop_end)
+    if len(starts) == 0 or len(ends) == 0:
+        return loop_start, loop_end, None
+
+    dist = pair_distances(starts, ends)
+    span = end_times[None, :] - start_times[:, None]
+    # Small tolerance so a span of exactly min_dur/max_dur frames survives float error
+    tol = 0.5 / native_fps
+    dist[(span < min_dur - tol) | (span > max_dur + tol)] = np.inf
+    i, j = np.unravel_index(np.argmin(dist), dist.shape)
+    if not np.isfinite(dist[i, j]):
+        return loop_start, loop_end, None
+    return float(start_times[i]), float(end_times[j]), float(dist[i, j])
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Generate multi-resolution WebP/AVIF derivatives of the website posters.
+
+Each source poster (<clip_id>.jpg) is decoded once, resized to every width in
+WIDTHS that is not larger than the source, and each size is encoded as WebP
+and (when Pillow has AVIF support) AVIF as <clip_id>_<width>.<ext>. The
+variants and their byte sizes are recorded in poster_derivatives.json; the
+page generators read it to emit srcset markup only for posters whose
+derivatives exist, and fall back to the plain JPEG otherwise.
+
+Unchanged posters (same size and mtime, all files present) are skipped.
+Upload the output directory next to the JPEG posters:
+
+    python poster_derivatives.py /tmp/posters --out /tmp/poster_derivatives
+    aws s3 sync /tmp/poster_derivatives s3://sublingualism-video/posters/
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, "poster_derivatives.json")
+WIDTHS = (480, 960, 1440)  # phone, tablet/1x desktop, 2x phone
+FORMATS = {
+    # ext: (Pillow format, MIME type, save options)
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 6}),
+    "webp": ("WEBP", "image/webp", {"quality": 78, "method": 5}),
+}
+# Browse pages are a single column inside a 1200px container with 2rem padding
+POSTER_SIZES = "(min-width: 1200px) 1136px, (min-width: 600px) calc(100vw - 4rem), calc(100vw - 2rem)"
+
+
+def available_formats():
+    """Formats from FORMATS that this Pillow build can encode, best first."""
+    return [ext for ext in FORMATS if features.check(FORMATS[ext][0].lower())]
+
+
+def load_index(path=INDEX_PATH):
+    """{clip_id: entry} from poster_derivatives.json, or {} if it doesn't exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def target_widths(src_width, widths):
+    """Widths not larger than the source; the source width if all are larger."""
+    return sorted(w for w in widths if w <= src_width) or [src_width]
+
+
+def make_derivatives(src_path, out_dir, widths=WIDTHS, formats=None):
+    """Decode one poster and write every width x format variant. Returns its index entry."""
+    formats = formats or available_formats()
+    clip_id = os.path.splitext(os.path.basename(src_path))[0]
+    st = os.stat(src_path)
+    with Image.open(src_path) as img:
+        img = img.convert("RGB")  # the one decode
+    src_w, src_h = img.size
+
+    variants = []
+    for width in target_widths(src_w, widths):
+        height = round(src_h * width / src_w)
+        resized = img if width == src_w else img.resize((width, height), Image.LANCZOS)
+        for ext in formats:
+            fmt, mime, options = FORMATS[ext]
+            name = f"{clip_id}_{width}.{ext}"
+            out_path = os.path.join(out_dir, name)
+            tmp_path = out_path + ".tmp"
+            resized.save(tmp_path, fmt, **options)
+            os.replace(tmp_path, out_path)
+            variants.append({
+                "file": name, "format": ext, "type": mime,
+                "width": width, "height": height, "bytes": os.path.getsize(out_path),
+            })
+
+    return clip_id, {
+        "source": {"size": st.st_size, "mtime": st.st_mtime, "width": src_w, "height": src_h},
+        "variants": variants,
+    }
+
+
+def is_current(entry, src_path, out_dir, widths, formats):
+    st = os.stat(src_path)
+    if entry["source"]["size"] != st.st_size or entry["source"]["mtime"] != st.st_mtime:
+        return False
+    have = {(v["width"], v["format"]) for v in entry["variants"]}
+    want = {(w, ext) for w in target_widths(entry["source"]["width"], widths) for ext in formats}
+    return want <= have and all(os.path.exists(os.path.join(out_dir, v["file"])) for v in entry["variants"])
+
+
+def poster_html(clip_id, cdn, index, img_attrs="", sizes=POSTER_SIZES):
+    """
+    Markup for a poster: a <picture> with AVIF/WebP srcsets when derivatives
+    exist, otherwise just the JPEG <img>. img_attrs go on the <img> either way,
+    so handlers should not assume the <img>'s parent is the clip element.
+    """
+    jpg = f"{cdn}/posters/{clip_id}.jpg"
+    attrs = f" {img_attrs}" if img_attrs else ""
+    entry = index.get(clip_id)
+    if not entry:
+        return f'<img src="{jpg}" alt=""{attrs}>'
+    sources = []
+    for ext in FORMATS:
+        variants = [v for v in entry["variants"] if v["format"] == ext]
+        if variants:
+            srcset = ", ".join(f'{cdn}/posters/{v["file"]} {v["width"]}w' for v in variants)
+            sources.append(f'<source type="{FORMATS[ext][1]}" srcset="{srcset}" sizes="{sizes}">')
+    src = entry["source"]
+    img = f'<img src="{jpg}" width="{src["width"]}" height="{src["height"]}" alt=""{attrs}>'
+    return f'<picture>{"".join(sources)}{img}</picture>'
+
+
+def _derive(job):
+    src_path, out_dir, widths, formats = job
+    return make_derivatives(src_path, out_dir, widths, formats)
+
+
+def main(poster_dir, out_dir, widths=WIDTHS, workers=1):
+    formats = available_formats()
+    if "avif" not in formats:
+        print("Pillow has no AVIF encoder; writing WebP only")
+    os.makedirs(out_dir, exist_ok=True)
+    index = load_index()
+
+    sources = sorted(
+        os.path.join(poster_dir, name) for name in os.listdir(poster_dir)
+        if name.lower().endswith(".jpg") and not name.startswith(".")
+    )
+    jobs = []
+    for src_path in sources:
+        entry = index.get(os.path.splitext(os.path.basename(src_path))[0])
+        if entry and is_current(entry, src_path, out_dir, widths, formats):
+            continue
+        jobs.append((src_path, out_dir, widths, formats))
+    print(f"{len(sources)} posters, {len(jobs)} new or changed", flush=True)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_derive, jobs, chunksize=8))
+    else:
+        results = [_derive(job) for job in jobs]
+    index.update(results)
+
+    tmp_path = INDEX_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, INDEX_PATH)
+
+    # Bytes a browser downloads per poster at each width, by format
+    jpeg_bytes = sum(e["source"]["size"] for e in index.values())
+    print(f"\nIndex written to {INDEX_PATH} ({len(index)} posters)")
+    print(f"  jpeg (source): {jpeg_bytes / 1024:.0f} KB")
+    for ext in formats:
+        for width in widths:
+            total = sum(v["bytes"] for e in index.values() for v in e["variants"]
+                        if v["format"] == ext and v["width"] == width)
+            if total:
+                print(f"  {ext} {width}w: {total / 1024:.0f} KB ({total / jpeg_bytes:.0%} of jpeg)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("poster_dir", help="directory of <clip_id>.jpg posters")
+    parser.add_argument("--out", default=None,
+                        help="output directory (default: <poster_dir>/derivatives)")
+    parser.add_argument("--widths", default=",".join(map(str, WIDTHS)),
+                        help="comma-separated widths in pixels")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="posters to encode concurrently")
+    args = parser.parse_args()
+    main(args.poster_dir, args.out or os.path.join(args.poster_dir, "derivatives"),
+         widths=tuple(int(w) for w in args.widths.split(",")), workers=args.workers)
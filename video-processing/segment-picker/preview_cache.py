@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Disk-backed LRU cache for segment picker preview transcodes.
+
+Entries are content-addressed by source path, source mtime, start, duration
+and output scale, so a re-encoded or replaced recording never serves a stale
+preview. Each entry is one .mp4 in CACHE_DIR; its mtime is bumped on every
+hit, so least-recently-used order survives server restarts. When the total
+size exceeds the budget the oldest entries are deleted.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preview_cache")
+DEFAULT_BUDGET_MB = 2048
+
+
+def preview_key(source_path, start, duration, scale):
+    """Cache key for a preview of source_path[start:start + duration] at scale."""
+    source_path = os.path.abspath(source_path)
+    ident = [
+        source_path,
+        os.path.getmtime(source_path),
+        round(float(start), 3),
+        round(float(duration), 3),
+        str(scale),
+    ]
+    return hashlib.sha1(json.dumps(ident).encode()).hexdigest()
+
+
+class PreviewCache:
+    """Size-bounded LRU of preview files with hit/miss counters."""
+
+    def __init__(self, cache_dir=CACHE_DIR, budget_mb=DEFAULT_BUDGET_MB):
+        self.cache_dir = cache_dir
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes = {}
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(".tmp"):
+                os.remove(path)  # left over from an interrupted write
+            elif name.endswith(".mp4"):
+                self._sizes[name[:-4]] = os.path.getsize(path)
+        self._bytes = sum(self._sizes.values())
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def get(self, key):
+        """Path of the cached preview, or None. Counts a hit or a miss."""
+        path = self._path(key)
+        with self._lock:
+            if key in self._sizes and os.path.exists(path):
+                os.utime(path)  # mark as recently used
+                self.hits += 1
+                return path
+            self._sizes.pop(key, None)
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        """Whether key is cached, without counting a hit or miss."""
+        with self._lock:
+            return key in self._sizes
+
+    def writer(self, key):
+        """CacheWriter for filling an entry incrementally (e.g. while streaming it)."""
+        return CacheWriter(self, key)
+
+    def _added(self, key, size):
+        """Account for a committed entry and evict old ones if over budget."""
+        with self._lock:
+            self._bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used entries until within budget. Caller holds the lock."""
+        if self._bytes <= self.budget:
+            return
+        entries = []
+        for key in self._sizes:
+            try:
+                entries.append((os.path.getmtime(self._path(key)), key))
+            except OSError:
+                entries.append((0, key))
+        for _, key in sorted(entries):
+            if self._bytes <= self.budget:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self._sizes),
+                "size_mb": round(self._bytes / (1024 * 1024), 1),
+                "budget_mb": round(self.budget / (1024 * 1024), 1),
+            }
+
+
+class CacheWriter:
+    """
+    An entry being written. Data goes to a temporary file; commit() moves it
+    into the cache, abort() (or an incomplete stream) discards it.
+    """
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.path = cache._path(key)
+        self.tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        self.size = 0
+        self._f = open(self.tmp, "wb")
+
+    def write(self, data):
+        self._f.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self._f.close()
+        os.replace(self.tmp, self.path)
+        self.cache._added(self.key, self.size)
+
+    def abort(self):
+        self._f.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Catalog of OBS recordings with cached ffprobe metadata.
+
+Indexes OBS_DIR once, resolves a video_id like '2026-02-07_19-39-37' to its
+.mov path with a dict lookup, and caches duration, resolution, fps and codec
+in recording_catalog.json keyed by path + size + mtime, so each recording is
+probed once rather than once per script, per clip and per field.
+
+Any file can be looked up with info(); it does not have to live in OBS_DIR.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from fractions import Fraction
+from pathlib import Path
+
+OBS_DIR = "/Volumes/Workspace/obs_recordings"
+INTRA_CODECS = {"prores", "dnxhd", "mjpeg"}  # every frame is a keyframe
+CACHE_PATH = Path(__file__).parent / "recording_catalog.json"
+
+
+def video_id_for(path):
+    """'2026-02-07 19-39-37.mov' -> '2026-02-07_19-39-37'."""
+    return Path(path).stem.replace(" ", "_")
+
+
+def frame_concat_list(path, frames, fps):
+    """
+    ffconcat listing with one entry per frame number in frames.
+
+    Each entry spans a quarter frame either side of the frame's timestamp
+    (microseconds are ffmpeg's resolution), so on an intra-only source one
+    ffmpeg reading it seeks to and decodes exactly that frame, at any rate.
+    """
+    quoted = str(path).replace("'", "'\\''")
+    listing = "ffconcat version 1.0\n"
+    for n in frames:
+        listing += (f"file '{quoted}'\ninpoint {(n + 0.25) / fps:.6f}\n"
+                    f"outpoint {(n + 0.75) / fps:.6f}\n")
+    return listing
+
+
+def probe(path):
+    """Duration, resolution, fps and codec of a video file from one ffprobe call."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "quiet", "-print_format", "json",
+         "-show_format", "-show_streams", "-select_streams", "v:0", path],
+        capture_output=True, text=True
+    )
+    data = json.loads(result.stdout or "{}")
+    if "format" not in data:
+        raise RuntimeError(f"ffprobe failed for {path}")
+    stream = (data.get("streams") or [{}])[0]
+    rate = stream.get("avg_frame_rate") or "0/0"
+    if rate == "0/0":
+        rate = stream.get("r_frame_rate") or "0/0"
+    return {
+        "duration": float(data["format"].get("duration") or stream.get("duration") or 0),
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "fps": float(Fraction(rate)) if rate != "0/0" else None,
+        "codec": stream.get("codec_name"),
+    }
+
+
+class RecordingCatalog:
+    """Recordings in obs_dir by video_id, with metadata cached on disk."""
+
+    def __init__(self, obs_dir=OBS_DIR, cache_path=CACHE_PATH):
+        self.obs_dir = obs_dir
+        self.cache_path = Path(cache_path)
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._meta = self._load()
+        self._dirty = set()  # paths probed since the last save
+
+    def _load(self):
+        """The on-disk cache, or {} if it is missing or unreadable."""
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _index(self):
+        if self._by_id is None:
+            by_id = {}
+            if os.path.isdir(self.obs_dir):
+                for name in sorted(os.listdir(self.obs_dir)):
+                    if name.endswith(".mov"):
+                        path = os.path.join(self.obs_dir, name)
+                        by_id[video_id_for(path)] = path
+            self._by_id = by_id
+        return self._by_id
+
+    def recordings(self):
+        """Sorted list of recording paths in obs_dir."""
+        return list(self._index().values())
+
+    def resolve(self, video_id):
+        """Path of the recording with this video_id, or None."""
+        return self._index().get(video_id)
+
+    def info(self, path, save=True):
+        """
+        Cached metadata for a file: duration, width, height, fps, codec, size, mtime.
+        With save=False a fresh probe is only written out by the next save.
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._meta.get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            return entry
+
+        entry = {**probe(path), "size": st.st_size, "mtime": st.st_mtime}
+        with self._lock:
+            self._meta[path] = entry
+            self._dirty.add(path)
+            if save:
+                self._save()
+        return entry
+
+    def refresh(self):
+        """Re-list obs_dir and probe any new or changed recordings, saving once."""
+        self._by_id = None
+        for path in self.recordings():
+            self.info(path, save=False)
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        """
+        Write the cache, merged with the file on disk so entries other processes
+        probed since we loaded it are kept. Caller holds the lock.
+        """
+        meta = self._load()
+        meta.update((path, self._meta[path]) for path in self._dirty)
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self.cache_path)
+        self._meta = meta
+        self._dirty.clear()
+
+
+_catalog = None
+
+
+def get_catalog():
+    """Process-wide catalog for OBS_DIR."""
+    global _catalog
+    if _catalog is None:
+        _catalog = RecordingCatalog()
+    return _catalog
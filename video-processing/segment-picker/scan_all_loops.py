@@ -2,17 +2,51 @@
 """
 Scan ALL OBS recordings for good ~10s loop candidates.
 
-Uses chunked frame extraction to keep memory bounded.
+Decodes each recording once through a single ffmpeg pipe and scores loop
+candidates against a fixed-size ring buffer, so decode work is linear in
+recording length and memory stays constant.
+
+With --refine, each segment chosen for export is snapped from the 3fps scan
+grid to the best pair of native frames before it is cut.
+
+The downscaled frames of every fully decoded recording are saved to the
+signature store (signature_store.py); later runs memory-map them instead of
+decoding again. Use --rescan to re-evaluate all recordings from the store
+after changing MIN_DURATION, MAX_DURATION, STEP or SCORE_THRESHOLD.
+
+With --prescan, intra-only recordings (ProRes) without a store are first
+sampled at PRESCAN_FPS by seeking, which decodes one frame per sample rather
+than the whole file; the loop scan then decodes only the live regions between
+black or frozen stretches. (A prescanned recording is not fully decoded, so
+no signature store is written.)
+
+Exports overlap with scanning: because non-overlap selection is per recording,
+each recording's new loops are queued on an ExportQueue (export_queue.py) as
+soon as it is scanned. --export-jobs encodes run at once, and finished exports
+are journaled so an interrupted batch resumes.
+
+With --workers N, recordings are scanned concurrently in a process pool and
+the candidate cache is rewritten atomically after each recording finishes.
+Scan decoders and export encodes run together, so they split one thread
+budget (--ffmpeg-threads, default the CPU count): each encode gets an equal
+share (or --export-threads) and the scan workers divide the rest.
 """
 
+import argparse
 import json
 import subprocess
 import numpy as np
 import gc
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-OBS_DIR = "/Volumes/Workspace/obs_recordings"
+from export_queue import ExportQueue
+from loop_search import refine_loop
+from recording_catalog import INTRA_CODECS, frame_concat_list, get_catalog, video_id_for
+from segment_selection import IntervalIndex, drop_excluded, select_non_overlapping
+from signature_store import load_signatures, record_signatures
+
 OUT_DIR = Path(__file__).parent / "exports_all_loops"
 EXISTING_RESULTS = Path(__file__).parent / "exports_looped" / "loop_results.json"
 
@@ -24,35 +58,137 @@ SAMPLE_FPS = 3
 SCORE_THRESHOLD = 0.06
 MIN_SEPARATION = 15.0
 SCALE_W, SCALE_H = 240, 68
-CHUNK_SECS = 30.0  # extract this many seconds at a time
+FFMPEG_THREADS = 0  # decoder threads per ffmpeg process, 0 = ffmpeg default
+
+# Dead-region prescan (--prescan)
+PRESCAN_FPS = 1
+PRESCAN_W, PRESCAN_H = 120, 34
+DEAD_MIN_DURATION = 3.0  # black/frozen stretches shorter than this are ignored
+BLACK_LEVEL = 10  # mean grey level below which a sample is black (as is_black_frame)
+FREEZE_DIFF = 1.0  # mean absolute grey difference below which a sample is frozen
 
 
 def get_video_duration(path):
-    result = subprocess.run(
-        ["ffprobe", "-v", "quiet", "-show_entries", "format=duration",
-         "-of", "csv=p=0", path],
-        capture_output=True, text=True
-    )
-    return float(result.stdout.strip())
+    return get_catalog().info(path)["duration"]
+
 
+def stream_frames(video_path, start=0, duration=None, fps=SAMPLE_FPS):
+    """Yield downscaled frames from one continuous ffmpeg decode.
 
-def extract_frames(video_path, start=0, duration=None, fps=SAMPLE_FPS):
-    """Extract frames from a time range."""
-    cmd = ["ffmpeg", "-v", "quiet", "-ss", str(start), "-i", video_path]
+    Each yielded array is a view into a reused buffer; copy it to keep it.
+    Raises RuntimeError at the end of the stream if ffmpeg exited with an
+    error, so a decode that died partway is not mistaken for the whole file.
+    """
+    cmd = ["ffmpeg", "-v", "quiet"]
+    if FFMPEG_THREADS:
+        cmd += ["-threads", str(FFMPEG_THREADS)]
+    cmd += ["-ss", str(start), "-i", video_path]
     if duration is not None:
         cmd += ["-t", str(duration)]
     cmd += [
         "-vf", f"fps={fps},scale={SCALE_W}:{SCALE_H}",
         "-pix_fmt", "rgb24", "-f", "rawvideo", "pipe:1"
     ]
-    result = subprocess.run(cmd, capture_output=True)
-    raw = result.stdout
-    frame_size = SCALE_W * SCALE_H * 3
-    n_frames = len(raw) // frame_size
-    if n_frames == 0:
-        return np.array([])
-    frames = np.frombuffer(raw[:n_frames * frame_size], dtype=np.uint8)
-    return frames.reshape(n_frames, SCALE_H, SCALE_W, 3)
+    frame = np.empty((SCALE_H, SCALE_W, 3), dtype=np.uint8)
+    buf = memoryview(frame).cast("B")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        while True:
+            got = 0
+            while got < len(buf):
+                n = proc.stdout.readinto(buf[got:])
+                if not n:
+                    break
+                got += n
+            if got < len(buf):
+                break
+            yield frame
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {proc.returncode} decoding {video_path}")
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def sample_frames(video_path, times, native_fps):
+    """Grey PRESCAN_W x PRESCAN_H frames at the given times, one seek per sample.
+
+    A concat list with one inpoint/outpoint entry per sample lets a single
+    ffmpeg process seek to each time; on an intra-only source each seek
+    decodes exactly one frame. Returns an (n, h, w) uint8 array, or None if
+    ffmpeg failed or did not return one frame per sample.
+    """
+    # Snap each time to the source frame grid, nearest frame
+    listing = frame_concat_list(video_path, [round(t * native_fps) for t in times], native_fps)
+    cmd = ["ffmpeg", "-v", "quiet"]
+    if FFMPEG_THREADS:
+        cmd += ["-threads", str(FFMPEG_THREADS)]
+    cmd += [
+        "-f", "concat", "-safe", "0", "-protocol_whitelist", "file,pipe", "-i", "pipe:0",
+        "-an", "-vf", f"scale={PRESCAN_W}:{PRESCAN_H}", "-fps_mode", "passthrough",
+        "-pix_fmt", "gray", "-f", "rawvideo", "pipe:1"
+    ]
+    result = subprocess.run(cmd, input=listing.encode(), capture_output=True)
+    frame_size = PRESCAN_W * PRESCAN_H
+    if result.returncode != 0 or len(result.stdout) != len(times) * frame_size:
+        return None
+    return np.frombuffer(result.stdout, dtype=np.uint8).reshape(len(times), PRESCAN_H, PRESCAN_W)
+
+
+def dead_runs(flags, times, min_duration):
+    """(start, end) of runs of True flags spanning at least min_duration seconds."""
+    runs = []
+    start = None
+    for i, flag in enumerate(list(flags) + [False]):
+        if flag and start is None:
+            start = i
+        elif not flag and start is not None:
+            if times[i - 1] - times[start] >= min_duration:
+                runs.append((times[start], times[i - 1]))
+            start = None
+    return runs
+
+
+def prescan_dead_regions(video_path, duration):
+    """Find black or frozen stretches from frames sampled at PRESCAN_FPS.
+
+    Returns a sorted list of (start, end) times in seconds, or None when the
+    recording cannot be sampled cheaply (not intra-only, or sampling failed).
+    """
+    info = get_catalog().info(video_path)
+    if info.get("codec") not in INTRA_CODECS or not info.get("fps"):
+        print(f"  Prescan skipped for {video_id_for(video_path)}: "
+              f"{info.get('codec')} is not intra-only; scanning in full", flush=True)
+        return None
+    times = [i / PRESCAN_FPS for i in range(int(duration * PRESCAN_FPS))]
+    frames = sample_frames(video_path, times, info["fps"])
+    if frames is None:
+        print(f"  Prescan failed for {video_id_for(video_path)} (ffmpeg error or "
+              f"frame count mismatch); scanning in full", flush=True)
+        return None
+
+    black = frames.mean(axis=(1, 2)) < BLACK_LEVEL
+    # Sample i is frozen if it matches sample i - 1, so the run starts one sample earlier
+    diffs = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=(1, 2))
+    frozen = np.concatenate([[False], diffs < FREEZE_DIFF])
+    frozen[:-1] |= frozen[1:]
+    dead = dead_runs(black, times, DEAD_MIN_DURATION) + dead_runs(frozen, times, DEAD_MIN_DURATION)
+    return sorted(set(dead))  # a black stretch is usually also frozen
+
+
+def live_regions(dead, duration, min_length=MIN_DURATION):
+    """Complement of the dead stretches, keeping regions long enough to hold a loop."""
+    live = []
+    pos = 0.0
+    for start, end in dead:
+        if start - pos >= min_length:
+            live.append((pos, start))
+        pos = max(pos, end)
+    if duration - pos >= min_length:
+        live.append((pos, duration))
+    return live
 
 
 def is_black_frame(frame, threshold=10):
@@ -63,191 +199,281 @@ def frame_variance(frame):
     return np.std(frame.astype(float))
 
 
-def scan_recording(mov_path):
-    """Scan a recording for loop candidates using chunked extraction."""
-    video_id = Path(mov_path).stem.replace(" ", "_")
+def scan_frames(frames, video_id, mov_path, time_offset=0.0):
+    """Evaluate loop candidates as frames arrive.
+
+    Keeps only the last max_span + 1 frames in a ring buffer, so memory is
+    constant no matter how long the recording is. A start point is scored
+    once its last possible end frame has arrived (or at end of stream).
+    """
+    min_span = int(MIN_DURATION * SAMPLE_FPS)
+    max_span = int(MAX_DURATION * SAMPLE_FPS)
+    step_frames = int(STEP * SAMPLE_FPS)
+
+    size = max_span + 1
+    ring = np.empty((size, SCALE_H, SCALE_W, 3), dtype=np.uint8)
+    candidates = []
+
+    def evaluate(sf, n):
+        """Score start frame sf against ends up to frame n (exclusive)."""
+        el = sf + min_span
+        eh = min(sf + max_span + 1, n)
+        if el >= eh:
+            return
+        if is_black_frame(ring[(sf + min_span // 2) % size]):
+            return
+
+        start_flat = ring[sf % size].reshape(-1).astype(np.int16)
+        end_block = ring[np.arange(el, eh) % size].reshape(eh - el, -1).astype(np.int16)
+        d = np.mean(np.abs(end_block - start_flat), axis=1) / 255.0
+        bi = np.argmin(d)
+        best_score = float(d[bi])
+        best_end = el + int(bi)
+
+        abs_start = time_offset + sf / SAMPLE_FPS
+        abs_end = time_offset + best_end / SAMPLE_FPS
+
+        mid = ring[((sf + best_end) // 2) % size]
+        interest = frame_variance(mid)
+
+        candidates.append({
+            "video_id": video_id,
+            "loop_start": round(abs_start, 2),
+            "loop_end": round(abs_end, 2),
+            "loop_duration": round(abs_end - abs_start, 2),
+            "loop_score": round(best_score, 6),
+            "visual_interest": round(float(interest), 2),
+            "source_path": mov_path,
+        })
+
+    n = 0
+    for frame in frames:
+        ring[n % size] = frame
+        n += 1
+        sf = n - size  # oldest frame still in the buffer
+        if sf >= 0 and sf % step_frames == 0:
+            evaluate(sf, n)
+
+    # End of stream: score start points whose full end window never arrived
+    first_pending = max(0, n - size + 1)
+    first_pending += -first_pending % step_frames
+    for sf in range(first_pending, n - min_span, step_frames):
+        evaluate(sf, n)
+
+    return candidates
+
+
+def scan_recording(mov_path, prescan=False):
+    """Scan a recording for loop candidates from a single streaming decode."""
+    video_id = video_id_for(mov_path)
     duration = get_video_duration(mov_path)
 
     if duration < MIN_DURATION + 2:
         print(f"  Skipping {video_id} ({duration:.0f}s) - too short")
         return video_id, []
 
-    print(f"  Scanning {video_id} ({duration:.0f}s)...", flush=True)
-
-    min_span = int(MIN_DURATION * SAMPLE_FPS)
-    max_span = int(MAX_DURATION * SAMPLE_FPS)
-    step_frames = int(STEP * SAMPLE_FPS)
-    overlap = MAX_DURATION + 2  # seconds of overlap between chunks
+    scale = (SCALE_W, SCALE_H)
+    signatures = load_signatures(mov_path, SAMPLE_FPS, scale)
+    try:
+        if signatures is not None:
+            print(f"  Scanning {video_id} ({duration:.0f}s) from signature store...", flush=True)
+            candidates = scan_frames(iter(signatures), video_id, mov_path)
+        elif prescan and (dead := prescan_dead_regions(mov_path, duration)) is not None:
+            regions = live_regions(dead, duration)
+            live = sum(end - start for start, end in regions)
+            print(f"  Scanning {video_id} ({duration:.0f}s, {live:.0f}s live in "
+                  f"{len(regions)} regions)...", flush=True)
+            candidates = []
+            for start, end in regions:
+                frames = stream_frames(mov_path, start=start, duration=end - start)
+                candidates.extend(scan_frames(frames, video_id, mov_path, time_offset=start))
+        else:
+            print(f"  Scanning {video_id} ({duration:.0f}s)...", flush=True)
+            # Allow a frame of rounding at the end; anything shorter is a truncated decode
+            expected = max(0, int(duration * SAMPLE_FPS) - 1)
+            frames = record_signatures(stream_frames(mov_path), mov_path, SAMPLE_FPS, scale,
+                                       min_frames=expected)
+            candidates = scan_frames(frames, video_id, mov_path)
+    except RuntimeError as e:
+        # Report no candidates so the recording is not cached as scanned and is retried
+        print(f"  ✗ {video_id}: {e}; skipping until the next run", flush=True)
+        return video_id, []
 
-    candidates = []
-    chunk_start = 0.0
+    print(f"    → {len(candidates)} candidates", flush=True)
+    return video_id, candidates
 
-    while chunk_start < duration:
-        chunk_dur = min(CHUNK_SECS + overlap, duration - chunk_start)
-        if chunk_dur < MIN_DURATION:
-            break
 
-        frames = extract_frames(mov_path, start=chunk_start, duration=chunk_dur)
-        n = len(frames)
-        if n < min_span:
-            chunk_start += CHUNK_SECS
-            continue
+def _init_worker(ffmpeg_threads):
+    """Process-pool initializer: give each worker its share of ffmpeg threads."""
+    global FFMPEG_THREADS
+    FFMPEG_THREADS = ffmpeg_threads
 
-        flat = frames.reshape(n, -1)
-
-        # Only scan start points within the non-overlap region
-        scan_limit = min(int(CHUNK_SECS * SAMPLE_FPS), n - min_span)
-
-        sf = 0
-        while sf < scan_limit and sf + min_span <= n:
-            mid_f = min(sf + min_span // 2, n - 1)
-            if is_black_frame(frames[mid_f]):
-                sf += step_frames
-                continue
-
-            el = sf + min_span
-            eh = min(sf + max_span + 1, n)
-            if el >= eh:
-                sf += step_frames
-                continue
-
-            start_flat = flat[sf].astype(np.int16)
-            end_block = flat[el:eh].astype(np.int16)
-            d = np.mean(np.abs(end_block - start_flat), axis=1) / 255.0
-            bi = np.argmin(d)
-            best_score = float(d[bi])
-            best_end = el + int(bi)
-
-            abs_start = chunk_start + sf / SAMPLE_FPS
-            abs_end = chunk_start + best_end / SAMPLE_FPS
-
-            mid = frames[(sf + best_end) // 2]
-            interest = frame_variance(mid)
-
-            candidates.append({
-                "video_id": video_id,
-                "loop_start": round(abs_start, 2),
-                "loop_end": round(abs_end, 2),
-                "loop_duration": round(abs_end - abs_start, 2),
-                "loop_score": round(best_score, 6),
-                "visual_interest": round(float(interest), 2),
-                "source_path": mov_path,
-            })
 
-            sf += step_frames
+def scan_good_candidates(mov_path, prescan=False):
+    """Scan one recording and keep candidates under SCORE_THRESHOLD."""
+    video_id, candidates = scan_recording(mov_path, prescan)
+    good = [c for c in candidates if c["loop_score"] <= SCORE_THRESHOLD]
+    print(f"    → {video_id}: {len(good)} good of {len(candidates)} (score ≤ {SCORE_THRESHOLD})\n", flush=True)
+    gc.collect()
+    return video_id, good
 
-        del frames, flat
-        gc.collect()
-        chunk_start += CHUNK_SECS
 
-    print(f"    → {len(candidates)} candidates", flush=True)
-    return video_id, candidates
+def save_candidates_cache(path, candidates):
+    """Write the candidate cache atomically so an interrupted run never truncates it."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(candidates, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 
 def select_best_non_overlapping(candidates):
-    by_video = {}
-    for c in candidates:
-        by_video.setdefault(c["video_id"], []).append(c)
-
-    selected = []
-    for vid, cands in by_video.items():
-        cands.sort(key=lambda c: (c["loop_score"], -c["visual_interest"]))
-        picked = []
-        for c in cands:
-            overlaps = any(
-                abs(c["loop_start"] - p["loop_start"]) < MIN_SEPARATION
-                for p in picked
-            )
-            if not overlaps:
-                picked.append(c)
-        selected.extend(picked)
-
-    selected.sort(key=lambda c: c["loop_score"])
-    return selected
-
-
-def export_mp4(source_path, start_time, duration, output_path):
-    subprocess.run([
+    return select_non_overlapping(candidates, MIN_SEPARATION)
+
+
+def export_mp4(source_path, start_time, duration, output_path, threads=None):
+    cmd = [
         "ffmpeg", "-y", "-v", "quiet",
         "-ss", str(start_time), "-t", str(duration),
         "-i", source_path,
         "-c:v", "libx264", "-crf", "18", "-preset", "medium",
         "-pix_fmt", "yuv420p", "-an",
-        output_path
-    ], check=True)
-
-
-def main():
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    subprocess.run(cmd + [output_path], check=True)
+
+
+def export_segment(seg, refine, output_path, threads=None):
+    """Refine (optionally) and export one selected loop. Runs on the export queue."""
+    seg = dict(seg)
+    if refine:
+        start, end, score = refine_loop(
+            seg["source_path"], seg["loop_start"], seg["loop_end"],
+            SAMPLE_FPS, MIN_DURATION, MAX_DURATION
+        )
+        if score is not None:
+            seg["coarse_score"] = seg["loop_score"]
+            seg["loop_start"] = round(start, 3)
+            seg["loop_end"] = round(end, 3)
+            seg["loop_duration"] = round(end - start, 3)
+            seg["loop_score"] = round(score, 6)
+
+    export_mp4(seg["source_path"], seg["loop_start"], seg["loop_duration"], output_path, threads)
+    file_size = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"  exported {Path(output_path).name} ({seg['loop_duration']:.1f}s, score={seg['loop_score']:.4f}, "
+          f"interest={seg['visual_interest']:.0f}) → {file_size:.1f}MB", flush=True)
+    return {"segment": {k: v for k, v in seg.items() if k != "source_path"}}
+
+
+def split_threads(total, scan_workers, export_jobs, export_threads=None):
+    """
+    (threads per scan decoder, threads per export encode) from one budget.
+
+    Every concurrent ffmpeg gets an equal share unless export_threads fixes
+    the encodes' share, in which case the decoders split what is left.
+    """
+    export_jobs = max(1, export_jobs)
+    if export_threads is None:
+        export_threads = max(1, total // (scan_workers + export_jobs))
+    scan_threads = max(1, (total - export_jobs * export_threads) // max(1, scan_workers))
+    return scan_threads, export_threads
+
+
+def main(refine=False, workers=1, ffmpeg_threads=None, rescan=False, prescan=False,
+         export_jobs=2, export_threads=None):
     OUT_DIR.mkdir(exist_ok=True)
 
-    existing_segments = set()
+    existing_segments = IntervalIndex(MIN_SEPARATION)
     if EXISTING_RESULTS.exists():
         with open(EXISTING_RESULTS) as f:
             for r in json.load(f):
-                existing_segments.add((r["video_id"], round(r["loop_start"])))
+                existing_segments.add(r["video_id"], round(r["loop_start"]))
 
-    recordings = sorted(Path(OBS_DIR).glob("*.mov"))
+    # Probe everything up front so pool workers only read the catalog cache
+    catalog = get_catalog()
+    catalog.refresh()
+    recordings = catalog.recordings()
     print(f"Found {len(recordings)} recordings")
     print(f"Already have {len(existing_segments)} segments\n")
 
+    mp4_dir = OUT_DIR / "mp4"
+    mp4_dir.mkdir(exist_ok=True)
+
+    # Selection is per recording, so each recording's exports can start as
+    # soon as it has been scanned instead of waiting for the whole archive.
+    thread_budget = ffmpeg_threads or os.cpu_count() or 1
+    _, export_threads = split_threads(thread_budget, workers, export_jobs, export_threads)
+    queue = ExportQueue(OUT_DIR / "export_journal.jsonl", export_jobs, export_threads)
+    queued = []  # (selection rank, seg_name, future)
+
+    def queue_exports(candidates):
+        picks = drop_excluded(select_best_non_overlapping(candidates), existing_segments)
+        for seg in picks:
+            seg_name = f"{seg['video_id']}_t{int(seg['loop_start']):04d}_loop"
+            mp4_path = str(mp4_dir / f"{seg_name}.mp4")
+            future = queue.submit(mp4_path, export_segment, seg, refine)
+            queued.append((seg["loop_score"], seg_name, future))
+
     # Load cached candidates from previous runs
     candidates_cache = OUT_DIR / "candidates_cache.json"
     all_candidates = []
     scanned_ids = set()
-    if candidates_cache.exists():
+    if candidates_cache.exists() and not rescan:
         with open(candidates_cache) as f:
             all_candidates = json.load(f)
         scanned_ids = {c["video_id"] for c in all_candidates}
         print(f"Loaded {len(all_candidates)} cached candidates from {len(scanned_ids)} recordings\n")
+        queue_exports(all_candidates)
 
+    to_scan = []
     for mov in recordings:
-        vid_id = mov.stem.replace(" ", "_")
+        vid_id = video_id_for(mov)
         if vid_id in scanned_ids:
             print(f"  {vid_id}: cached, skipping")
             continue
-        _, candidates = scan_recording(str(mov))
-        good = [c for c in candidates if c["loop_score"] <= SCORE_THRESHOLD]
+        to_scan.append(mov)
+
+    def scanned(good):
         all_candidates.extend(good)
-        print(f"    → {len(good)} good of {len(candidates)} (score ≤ {SCORE_THRESHOLD})\n")
-        gc.collect()
         # Save progress after each recording
-        with open(candidates_cache, "w") as f:
-            json.dump(all_candidates, f, indent=2)
+        save_candidates_cache(candidates_cache, all_candidates)
+        queue_exports(good)
+
+    workers = max(1, min(workers, len(to_scan)))
+    per_worker, _ = split_threads(thread_budget, workers, export_jobs, export_threads)
+    if workers > 1:
+        print(f"Scanning {len(to_scan)} recordings with {workers} workers "
+              f"({per_worker} ffmpeg threads each, {export_threads} per export)\n", flush=True)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(per_worker,)) as pool:
+            futures = [pool.submit(scan_good_candidates, path, prescan) for path in to_scan]
+            for future in as_completed(futures):
+                _, good = future.result()
+                scanned(good)
+    else:
+        _init_worker(per_worker)
+        for path in to_scan:
+            _, good = scan_good_candidates(path, prescan)
+            scanned(good)
 
     print(f"Total good candidates: {len(all_candidates)}")
-
-    selected = select_best_non_overlapping(all_candidates)
-    print(f"After de-overlap: {len(selected)}")
-
-    new_segments = []
-    for s in selected:
-        is_existing = any(
-            s["video_id"] == ev and abs(s["loop_start"] - es) < MIN_SEPARATION
-            for (ev, es) in existing_segments
-        )
-        if not is_existing:
-            new_segments.append(s)
-
-    print(f"New segments (excluding existing): {len(new_segments)}\n")
-
-    mp4_dir = OUT_DIR / "mp4"
-    mp4_dir.mkdir(exist_ok=True)
+    print(f"New segments (de-overlapped, excluding existing): {len(queued)}")
+    print(f"Waiting for exports ({queue.jobs} at a time, {queue.threads_per_job} threads each)...\n",
+          flush=True)
 
     exported = []
-    for i, seg in enumerate(new_segments):
-        vid = seg["video_id"]
-        seg_name = f"{vid}_t{int(seg['loop_start']):04d}_loop"
-        mp4_path = str(mp4_dir / f"{seg_name}.mp4")
-
-        print(f"[{i+1}/{len(new_segments)}] {seg_name} ({seg['loop_duration']:.1f}s, score={seg['loop_score']:.4f}, interest={seg['visual_interest']:.0f})")
-
-        export_mp4(seg["source_path"], seg["loop_start"], seg["loop_duration"], mp4_path)
-        file_size = os.path.getsize(mp4_path) / (1024 * 1024)
-        print(f"  → {file_size:.1f}MB")
-
-        seg["output_file"] = f"{seg_name}.mp4"
-        seg["file_size_mb"] = round(file_size, 1)
-        exported.append({k: v for k, v in seg.items() if k != "source_path"})
+    with queue:
+        for _, seg_name, future in sorted(queued, key=lambda q: q[0]):
+            record = future.result()
+            if record.get("resumed"):
+                print(f"  {seg_name}: already exported, resuming")
+            exported.append({
+                **record["segment"],
+                "output_file": f"{seg_name}.mp4",
+                "file_size_mb": record["size_mb"],
+            })
 
     results_path = OUT_DIR / "scan_results.json"
     with open(results_path, "w") as f:
@@ -258,4 +484,25 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--refine", action="store_true",
+                        help="snap exported loops to native frame rate")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="recordings to scan concurrently")
+    parser.add_argument("--ffmpeg-threads", type=int, default=None,
+                        help="total ffmpeg threads shared by scan workers and export encodes "
+                             "(default: CPU count)")
+    parser.add_argument("--rescan", action="store_true",
+                        help="ignore the candidate cache and re-score every recording "
+                             "(from the signature store where available)")
+    parser.add_argument("--prescan", action="store_true",
+                        help="skip black/frozen stretches found by sampling intra-only recordings at PRESCAN_FPS")
+    parser.add_argument("--export-jobs", type=int, default=2,
+                        help="mp4 encodes to run at once while scanning")
+    parser.add_argument("--export-threads", type=int, default=None,
+                        help="ffmpeg threads per encode, taken from the --ffmpeg-threads budget "
+                             "(default: an equal share with the scan workers)")
+    args = parser.parse_args()
+    main(refine=args.refine, workers=args.workers, ffmpeg_threads=args.ffmpeg_threads,
+         rescan=args.rescan, prescan=args.prescan,
+         export_jobs=args.export_jobs, export_threads=args.export_threads)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Shared non-overlap selection for loop candidates.
+
+Each video keeps a sorted list of picked loop starts, so checking whether a
+candidate is within MIN_SEPARATION of anything already picked (or of an
+existing segment) is a binary search instead of a scan over every pick.
+"""
+
+from bisect import bisect_right, insort
+
+
+class IntervalIndex:
+    """Sorted loop starts per video with logarithmic separation checks."""
+
+    def __init__(self, min_separation, entries=()):
+        self.min_separation = min_separation
+        self._starts = {}
+        for video_id, start in entries:
+            self.add(video_id, start)
+
+    def add(self, video_id, start):
+        insort(self._starts.setdefault(video_id, []), start)
+
+    def conflicts(self, video_id, start):
+        """True if some indexed start in this video is closer than min_separation."""
+        starts = self._starts.get(video_id)
+        if not starts:
+            return False
+        i = bisect_right(starts, start - self.min_separation)
+        return i < len(starts) and starts[i] < start + self.min_separation
+
+    def __len__(self):
+        return sum(len(s) for s in self._starts.values())
+
+
+def rank_key(c):
+    """Best loops first; ties go to the more visually interesting one."""
+    return (c["loop_score"], -c["visual_interest"])
+
+
+def select_non_overlapping(candidates, min_separation, exclude=None):
+    """
+    Greedily pick the best candidates per video so no two picks start within
+    min_separation of each other.
+
+    exclude: optional IntervalIndex of existing segments. Candidates close to
+    an existing segment are skipped and do not block other candidates.
+    Returns the picks sorted by loop_score.
+    """
+    picked = IntervalIndex(min_separation)
+    selected = []
+    for c in sorted(candidates, key=rank_key):
+        vid, start = c["video_id"], c["loop_start"]
+        if picked.conflicts(vid, start):
+            continue
+        if exclude is not None and exclude.conflicts(vid, start):
+            continue
+        picked.add(vid, start)
+        selected.append(c)
+
+    selected.sort(key=lambda c: c["loop_score"])
+    return selected
+
+
+def drop_excluded(candidates, exclude):
+    """Candidates that are not within the separation of an excluded segment."""
+    return [c for c in candidates if not exclude.conflicts(c["video_id"], c["loop_start"])]
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Indexed segment store for the segment picker.
+
+Replaces the monolithic manifest.json as the source of truth with a SQLite
+database (segments.db) indexed on video_id, start and group, so each consumer
+reads and writes only the rows it needs. export_manifest() still produces the
+manifest.json layout for anything that wants the whole thing.
+
+Segment fields without a dedicated column (annotations added by later tools)
+round-trip through a JSON "extra" column. Numeric columns have no declared
+type, so an integral value read from manifest.json comes back as it went in
+(0 stays 0, 0.0 stays 0.0) and re-exporting does not churn the file.
+
+open_store() re-imports manifest.json whenever it is newer than the copy the
+store last imported or exported (e.g. after a git pull).
+"""
+
+import json
+import os
+import sqlite3
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, "segments.db")
+MANIFEST_PATH = os.path.join(BASE_DIR, "manifest.json")
+SCHEMA_VERSION = 1  # PRAGMA user_version; older stores are rebuilt on connect
+
+VIDEO_COLUMNS = ["video_id", "path", "duration", "size", "mtime"]
+# (manifest key, column) in manifest order
+SEGMENT_COLUMNS = [
+    ("index", "idx"),
+    ("start", "start"),
+    ("end", "end"),
+    ("duration", "duration"),
+    ("thumbnail", "thumbnail"),
+    ("group", "grp"),
+    ("group_size", "group_size"),
+    ("group_representative", "group_representative"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    path TEXT,
+    duration,
+    size,
+    mtime,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    video_id TEXT NOT NULL REFERENCES videos(video_id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    start,
+    "end",
+    duration,
+    thumbnail TEXT,
+    grp INTEGER,
+    group_size INTEGER,
+    group_representative INTEGER,
+    extra TEXT,
+    PRIMARY KEY (video_id, idx)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE INDEX IF NOT EXISTS segments_start ON segments(start);
+CREATE INDEX IF NOT EXISTS segments_group ON segments(video_id, grp);
+CREATE INDEX IF NOT EXISTS videos_position ON videos(position);
+"""
+
+
+def connect(path=DB_PATH):
+    """Open the store, creating the schema if needed."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        _upgrade(conn)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _upgrade(conn):
+    """Rebuild a store from before SCHEMA_VERSION, keeping its contents."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'videos'").fetchone()
+    manifest = load_manifest(conn) if exists else []
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS segments")
+        conn.execute("DROP TABLE IF EXISTS videos")
+    conn.executescript(SCHEMA)
+    write_manifest(conn, manifest)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _video_row(info, position):
+    extra = {k: v for k, v in info.items() if k not in VIDEO_COLUMNS and k != "segments"}
+    return (info["video_id"], position, info.get("path"), info.get("duration"),
+            info.get("size"), info.get("mtime"), json.dumps(extra) if extra else None)
+
+
+def _segment_row(video_id, seg):
+    known = {key for key, _ in SEGMENT_COLUMNS}
+    extra = {k: v for k, v in seg.items() if k not in known}
+    values = [seg.get(key) for key, _ in SEGMENT_COLUMNS]
+    return (video_id, *values, json.dumps(extra) if extra else None)
+
+
+def _video_dict(row):
+    info = {k: row[k] for k in VIDEO_COLUMNS if row[k] is not None}
+    if row["extra"]:
+        info.update(json.loads(row["extra"]))
+    return info
+
+
+def _segment_dict(row):
+    seg = {}
+    for key, col in SEGMENT_COLUMNS:
+        value = row[col]
+        if value is None:
+            continue
+        if key == "group_representative":
+            value = bool(value)
+        seg[key] = value
+    if row["extra"]:
+        seg.update(json.loads(row["extra"]))
+    return seg
+
+
+def _insert_video(conn, info, position):
+    """Replace one recording and its segments; the caller owns the transaction."""
+    placeholders = ", ".join("?" * (len(SEGMENT_COLUMNS) + 2))
+    columns = ", ".join(["video_id"] + [f'"{col}"' for _, col in SEGMENT_COLUMNS] + ["extra"])
+    conn.execute("DELETE FROM segments WHERE video_id = ?", (info["video_id"],))
+    conn.execute("INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 _video_row(info, position))
+    conn.executemany(f"INSERT INTO segments ({columns}) VALUES ({placeholders})",
+                     [_segment_row(info["video_id"], seg) for seg in info["segments"]])
+
+
+def write_video(conn, info, position=None):
+    """Insert or replace one recording and all of its segments."""
+    with conn:
+        if position is None:
+            row = conn.execute("SELECT position FROM videos WHERE video_id = ?",
+                               (info["video_id"],)).fetchone()
+            if row is None:
+                row = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM videos").fetchone()
+            position = row[0]
+        _insert_video(conn, info, position)
+
+
+def update_segments(conn, video_id, segments):
+    """Rewrite the given segments of one recording (e.g. after adding annotations)."""
+    placeholders = ", ".join("?" * (len(SEGMENT_COLUMNS) + 2))
+    columns = ", ".join(["video_id"] + [f'"{col}"' for _, col in SEGMENT_COLUMNS] + ["extra"])
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO segments ({columns}) VALUES ({placeholders})",
+                         [_segment_row(video_id, seg) for seg in segments])
+
+
+def write_manifest(conn, manifest):
+    """Replace the store contents with a manifest-format list, in one transaction."""
+    with conn:
+        conn.execute("DELETE FROM segments")
+        conn.execute("DELETE FROM videos")
+        for position, info in enumerate(manifest):
+            _insert_video(conn, info, position)
+
+
+def set_order(conn, video_ids):
+    """Renumber recordings to follow video_ids; any others are deleted."""
+    with conn:
+        conn.execute("UPDATE videos SET position = -1 - position")
+        conn.executemany("UPDATE videos SET position = ? WHERE video_id = ?",
+                         [(i, v) for i, v in enumerate(video_ids)])
+        conn.execute("DELETE FROM videos WHERE position < 0")
+
+
+def list_videos(conn, after=None, limit=None):
+    """Recordings in manifest order, without segments but with segment_count.
+
+    after/limit page through the list by the returned "position" field.
+    """
+    sql = ("SELECT v.*, (SELECT COUNT(*) FROM segments s WHERE s.video_id = v.video_id) AS n "
+           "FROM videos v")
+    args = []
+    if after is not None:
+        sql += " WHERE v.position > ?"
+        args.append(after)
+    sql += " ORDER BY v.position"
+    if limit is not None:
+        sql += " LIMIT ?"
+        args.append(limit)
+    videos = []
+    for row in conn.execute(sql, args):
+        info = _video_dict(row)
+        info["segment_count"] = row["n"]
+        info["position"] = row["position"]
+        videos.append(info)
+    return videos
+
+
+def query_segments(conn, video_id=None, start=None, end=None, group=None):
+    """Segments matching all given filters, ordered by video and index.
+
+    start/end select segments overlapping [start, end) in seconds.
+    """
+    clauses, args = [], []
+    if video_id is not None:
+        clauses.append("video_id = ?")
+        args.append(video_id)
+    if start is not None:
+        clauses.append('"end" > ?')
+        args.append(start)
+    if end is not None:
+        clauses.append("start < ?")
+        args.append(end)
+    if group is not None:
+        clauses.append("grp = ?")
+        args.append(group)
+    sql = "SELECT * FROM segments"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY video_id, idx"
+    return [dict(_segment_dict(row), video_id=row["video_id"]) for row in conn.execute(sql, args)]
+
+
+def get_video(conn, video_id):
+    """One recording in manifest format (with segments), or None."""
+    row = conn.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+    if row is None:
+        return None
+    info = _video_dict(row)
+    info["segments"] = [
+        _segment_dict(r) for r in
+        conn.execute("SELECT * FROM segments WHERE video_id = ? ORDER BY idx", (video_id,))
+    ]
+    return info
+
+
+def load_manifest(conn):
+    """Whole store in manifest.json format."""
+    manifest = []
+    by_id = {}
+    for row in conn.execute("SELECT * FROM videos ORDER BY position"):
+        info = _video_dict(row)
+        info["segments"] = []
+        by_id[info["video_id"]] = info
+        manifest.append(info)
+    for row in conn.execute("SELECT * FROM segments ORDER BY video_id, idx"):
+        by_id[row["video_id"]]["segments"].append(_segment_dict(row))
+    return manifest
+
+
+def _synced_mtime(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'manifest_mtime'").fetchone()
+    return None if row is None else row[0]
+
+
+def _set_synced_mtime(conn, path):
+    """Remember the mtime of the manifest.json the store now matches."""
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('manifest_mtime', ?)",
+                     (os.stat(path).st_mtime,))
+
+
+def export_manifest(conn, path=MANIFEST_PATH):
+    """Write the manifest.json compatibility file atomically."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(load_manifest(conn), f, indent=2)
+    os.replace(tmp, path)
+    _set_synced_mtime(conn, path)
+
+
+def open_store(path=DB_PATH, manifest_path=MANIFEST_PATH):
+    """Connect, importing manifest.json if it is newer than the store's last sync."""
+    conn = connect(path)
+    if os.path.exists(manifest_path):
+        synced = _synced_mtime(conn)
+        if synced is None or os.stat(manifest_path).st_mtime > synced:
+            with open(manifest_path) as f:
+                write_manifest(conn, json.load(f))
+            _set_synced_mtime(conn, manifest_path)
+    return conn
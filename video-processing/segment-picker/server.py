@@ -1,19 +1,217 @@
 #!/usr/bin/env python3
-"""Local server for the segment picker GUI."""
+"""Local server for the segment picker GUI.
 
+Requests are handled on threads, so thumbnails and the manifest are served
+while previews transcode. /video transcodes take a slot in a bounded
+TranscodePool: when every slot is busy and the wait queue is full the server
+answers 503, and previews requested with priority=low are cancelled as soon
+as a normal request needs their slot.
+
+After each preview request the server prefetches the previous and next
+segments of the same recording (manifest order) into the preview cache at low
+priority. Jumping to a segment that is not a neighbour cancels prefetches
+that are no longer useful; requesting one that is still being prefetched
+waits for it instead of transcoding twice.
+
+POST /export returns a job id immediately and cuts the clips in the
+background (--export-workers at a time); GET /jobs/<id> streams per-clip
+progress as NDJSON until the job is done.
+
+Recordings with an HLS proxy (build_proxies.py) are served by remuxing the
+proxy segments that cover the request, without the pool, cache or prefetch.
+
+The picker loads the manifest progressively: /manifest/videos?after=&limit=
+pages through recordings without their segments, and /manifest/video/<id>
+returns one recording with segments. JSON responses carry a content-hash ETag
+where they can be revalidated and are gzip- or (if the brotli module is
+installed) brotli-compressed when the client accepts it.
+"""
+
+import argparse
+import email.utils
+import gzip
+import hashlib
 import http.server
 import json
 import os
 import subprocess
+import threading
 import urllib.parse
 import mimetypes
 import re
 
+import build_proxies
+import segment_store
+from export_jobs import ExportJobs
+from preview_cache import DEFAULT_BUDGET_MB, PreviewCache, preview_key
+from recording_catalog import video_id_for
+from transcode_pool import HIGH, LOW, Cancelled, PoolFull, TranscodePool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 PORT = 8765
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EXPORT_DIR = os.path.join(BASE_DIR, "exports")
+THUMB_ROOT = os.path.join(BASE_DIR, "thumbnails")
+PREVIEW_WIDTH = 1920
+STREAM_CHUNK = 64 * 1024
+SENDFILE_CHUNK = 8 * 1024 * 1024
+
+# Thumbnails are written once and never change in place; sprites are only
+# immutable when requested with their ?v= version from the manifest
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+PREVIEW_CACHE_CONTROL = "private, max-age=3600"
+
+COMPRESS_MIN = 1024  # bytes; smaller JSON bodies are sent uncompressed
+MANIFEST_PAGE = 20  # recordings per /manifest/videos page by default
+MANIFEST_PAGE_MAX = 200
+
+PREFETCH_WAIT = 30  # seconds a request waits for an in-flight prefetch of the same preview
+
+preview_cache = None  # PreviewCache, created in __main__
+transcode_pool = TranscodePool()
+export_jobs = None  # ExportJobs, created in __main__
+prefetch_enabled = True
+_prefetching = {}  # preview key -> Event set when the prefetch finishes
+_prefetch_lock = threading.Lock()
+_manifest_cache = {"mtime": None, "by_path": {}}
+
+
+def transcode_cmd(video_path, start, duration):
+    """ffmpeg command writing a fragmented mp4 preview to stdout."""
+    return [
+        "ffmpeg", "-v", "quiet",
+        "-ss", str(start), "-i", video_path, "-t", str(duration),
+        "-vf", f"scale={PREVIEW_WIDTH}:-1",
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
+        "-c:a", "aac", "-movflags", "frag_keyframe+empty_moov",
+        "-f", "mp4", "pipe:1"
+    ]
+
+
+def job_label(video_path, start):
+    return (os.path.abspath(video_path), round(float(start), 3))
+
+
+def recording_segments(video_path):
+    """Segments of a recording in manifest order, from the store or manifest.json."""
+    if os.path.exists(segment_store.DB_PATH):
+        conn = segment_store.open_store()
+        try:
+            return segment_store.query_segments(conn, video_id=video_id_for(video_path))
+        finally:
+            conn.close()
+    manifest_path = os.path.join(BASE_DIR, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return []
+    mtime = os.path.getmtime(manifest_path)
+    if _manifest_cache["mtime"] != mtime:
+        with open(manifest_path) as f:
+            by_path = {os.path.abspath(v["path"]): v["segments"] for v in json.load(f)}
+        _manifest_cache.update(mtime=mtime, by_path=by_path)
+    return _manifest_cache["by_path"].get(os.path.abspath(video_path), [])
+
+
+def neighbours(video_path, start):
+    """(start, duration) of the next and previous segments around start."""
+    segments = recording_segments(video_path)
+    starts = [round(seg["start"], 3) for seg in segments]
+    try:
+        i = starts.index(round(float(start), 3))
+    except ValueError:
+        return []
+    return [(segments[j]["start"], segments[j]["duration"])
+            for j in (i + 1, i - 1) if 0 <= j < len(segments)]
+
+
+def prefetch_preview(video_path, start, duration):
+    """Transcode one preview into the cache at low priority (runs on its own thread)."""
+    key = preview_key(video_path, start, duration, PREVIEW_WIDTH)
+    with _prefetch_lock:
+        if key in preview_cache or key in _prefetching:
+            return
+        done = _prefetching[key] = threading.Event()
+    try:
+        try:
+            job = transcode_pool.acquire(LOW, label=job_label(video_path, start))
+        except (PoolFull, Cancelled):
+            return
+        writer = preview_cache.writer(key)
+        try:
+            proc = subprocess.Popen(transcode_cmd(video_path, start, duration),
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            job.attach(proc)
+            for chunk in iter(lambda: proc.stdout.read(STREAM_CHUNK), b""):
+                writer.write(chunk)
+            proc.stdout.close()
+            # Killed (cancelled) transcodes exit non-zero and are not cached
+            if proc.wait() == 0 and writer.size:
+                writer.commit()
+            else:
+                writer.abort()
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            transcode_pool.release(job)
+    finally:
+        with _prefetch_lock:
+            del _prefetching[key]
+        done.set()
+
+
+def schedule_prefetch(video_path, start):
+    """
+    Prefetch the neighbours of the segment at start and cancel low-priority
+    work for anything else (the user jumped away from it).
+    """
+    if preview_cache is None or not prefetch_enabled or build_proxies.is_current(video_path):
+        return
+    wanted = neighbours(video_path, start)
+    keep = {job_label(video_path, s) for s, _ in wanted} | {job_label(video_path, start)}
+    transcode_pool.cancel_low(keep=lambda job: job.label in keep)
+    for s, d in wanted:
+        threading.Thread(target=prefetch_preview, args=(video_path, s, d), daemon=True).start()
+
+# Sprite sheets are requested on every page load; keep them in memory
+_sprite_cache = {}  # path -> (mtime, bytes)
+
+def read_sprite(filepath):
+    mtime = os.path.getmtime(filepath)
+    cached = _sprite_cache.get(filepath)
+    if cached is None or cached[0] != mtime:
+        with open(filepath, "rb") as f:
+            cached = (mtime, f.read())
+        _sprite_cache[filepath] = cached
+    return cached[1]
+
+def parse_range(header, size):
+    """
+    (first, last) byte offsets for a single-range "bytes=" header, or None to
+    send the whole file. Raises ValueError if the range is unsatisfiable.
+    """
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not m or m.group(1) == m.group(2) == "":
+        return None  # absent, malformed or multi-range: ignore it
+    if m.group(1) == "":
+        length = int(m.group(2))
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    first = int(m.group(1))
+    last = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if first >= size or last < first:
+        raise ValueError(header)
+    return first, last
 
 class SegmentPickerHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 for chunked /video and /jobs responses; every other response sends Content-Length
+    protocol_version = "HTTP/1.1"
+    head_only = False
 
     def do_GET(self):
         parsed = urllib.parse.urlparse(self.path)
@@ -23,104 +221,402 @@ class SegmentPickerHandler(http.server.BaseHTTPRequestHandler):
         if path == "/":
             self.serve_file("index.html", "text/html")
         elif path == "/manifest.json":
-            self.serve_file("manifest.json", "application/json")
+            if os.path.exists(segment_store.DB_PATH):
+                self.serve_store(segment_store.load_manifest, validate=True)
+            else:
+                self.serve_file("manifest.json", "application/json")
+        elif path == "/manifest/videos":
+            self.serve_manifest_page(params)
+        elif path.startswith("/manifest/video/"):
+            self.serve_manifest_video(urllib.parse.unquote(path[len("/manifest/video/"):]))
+        elif path == "/videos":
+            self.serve_store(segment_store.list_videos)
+        elif path == "/segments":
+            self.serve_segments(params)
         elif path.startswith("/thumbnails/"):
-            filepath = os.path.join(BASE_DIR, path.lstrip("/"))
-            if os.path.exists(filepath):
-                self.serve_static(filepath)
+            filepath = os.path.realpath(os.path.join(BASE_DIR, urllib.parse.unquote(path).lstrip("/")))
+            if filepath.startswith(os.path.realpath(THUMB_ROOT) + os.sep) and os.path.isfile(filepath):
+                self.serve_static(filepath, versioned="v" in params)
             else:
                 self.send_error(404)
         elif path == "/video":
             self.serve_video_range(params)
+        elif path == "/preview-cache":
+            self.send_json(preview_cache.stats() if preview_cache else {})
+        elif path == "/transcodes":
+            self.send_json(transcode_pool.stats())
+        elif path == "/jobs":
+            self.send_json(export_jobs.list())
+        elif path.startswith("/jobs/"):
+            self.stream_job(path[len("/jobs/"):])
         else:
             self.send_error(404)
 
+    def do_HEAD(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == "/" or path.startswith("/thumbnails/"):
+            # The connection is kept alive, so later requests on it must send bodies again
+            self.head_only = True
+            try:
+                self.do_GET()
+            finally:
+                self.head_only = False
+        else:
+            self.send_error(405)
+
     def do_POST(self):
         parsed = urllib.parse.urlparse(self.path)
         if parsed.path == "/export":
             content_length = int(self.headers["Content-Length"])
-            body = json.loads(self.rfile.read(content_length))
+            try:
+                body = json.loads(self.rfile.read(content_length))
+            except ValueError:
+                self.send_error(400, "Invalid JSON")
+                return
             self.handle_export(body)
         else:
             self.send_error(404)
 
     def serve_file(self, filename, content_type):
-        filepath = os.path.join(BASE_DIR, filename)
-        with open(filepath, "rb") as f:
-            data = f.read()
-        self.send_response(200)
+        self.serve_path(os.path.join(BASE_DIR, filename), content_type)
+
+    def not_modified(self, etag, mtime):
+        """True if the request's validators match, so a 304 can be sent."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def send_not_modified(self, etag, cache_control):
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+
+    def serve_path(self, filepath, content_type=None, cache_control=REVALIDATE, data=None):
+        """
+        Serve a file with ETag/Last-Modified validation (304), single byte
+        ranges (206) and zero-copy sendfile. data, if given, is the file's
+        current content already in memory.
+        """
+        content_type = content_type or mimetypes.guess_type(filepath)[0] or "application/octet-stream"
+        st = os.stat(filepath)
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        if self.not_modified(etag, st.st_mtime):
+            self.send_not_modified(etag, cache_control)
+            return
+
+        size = st.st_size if data is None else len(data)
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if if_range is None or if_range.strip() == etag:
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        first, last = byte_range or (0, size - 1)
+
+        self.send_response(206 if byte_range else 200)
         self.send_header("Content-Type", content_type)
-        self.send_header("Content-Length", len(data))
+        self.send_header("Content-Length", last - first + 1)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))
+        self.send_header("Cache-Control", cache_control)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
         self.end_headers()
-        self.wfile.write(data)
+        if self.head_only or size == 0:
+            return
+        if data is not None:
+            self.wfile.write(data[first:last + 1])
+        else:
+            with open(filepath, "rb") as f:
+                self.send_file_range(f, first, last - first + 1)
 
-    def serve_static(self, filepath):
-        mime = mimetypes.guess_type(filepath)[0] or "application/octet-stream"
-        with open(filepath, "rb") as f:
-            data = f.read()
-        self.send_response(200)
-        self.send_header("Content-Type", mime)
+    def send_file_range(self, f, offset, length):
+        """Copy length bytes of f from offset to the socket, with sendfile where available."""
+        self.wfile.flush()
+        if hasattr(os, "sendfile"):
+            try:
+                while length > 0:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset,
+                                       min(length, SENDFILE_CHUNK))
+                    if sent == 0:
+                        return
+                    offset += sent
+                    length -= sent
+                return
+            except OSError as e:
+                if isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                    raise
+                # e.g. a socket type sendfile does not support; fall through
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(length, STREAM_CHUNK))
+            if not chunk:
+                return
+            self.wfile.write(chunk)
+            length -= len(chunk)
+
+    def accepted_encoding(self):
+        """Best Content-Encoding the client accepts: "br", "gzip" or None."""
+        accepted = {}
+        for part in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, q = part.strip().partition(";q=")
+            try:
+                accepted[name.lower()] = float(q) if q else 1.0
+            except ValueError:
+                continue
+        for encoding in ("br", "gzip"):
+            if encoding == "br" and brotli is None:
+                continue
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def send_json(self, obj, status=200, validate=False):
+        """
+        Send obj as JSON, compressed if the client accepts it. With validate, a
+        content hash is sent as the ETag (one per encoding) and a matching
+        If-None-Match gets a 304.
+        """
+        data = json.dumps(obj).encode()
+        encoding = self.accepted_encoding() if len(data) >= COMPRESS_MIN else None
+        etag = None
+        if validate:
+            suffix = f"-{encoding}" if encoding else ""
+            etag = f'"{hashlib.sha1(data).hexdigest()}{suffix}"'
+            if self.not_modified(etag, None):
+                self.send_not_modified(etag, REVALIDATE)
+                return
+        if encoding == "br":
+            data = brotli.compress(data, quality=5)
+        elif encoding == "gzip":
+            data = gzip.compress(data, compresslevel=6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", len(data))
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", REVALIDATE)
         self.end_headers()
         self.wfile.write(data)
 
+    def serve_store(self, query, validate=False, **filters):
+        """Answer from the segment store; each request gets its own connection."""
+        conn = segment_store.open_store()
+        try:
+            result = query(conn, **filters)
+        finally:
+            conn.close()
+        self.send_json(result, validate=validate)
+
+    def serve_manifest_page(self, params):
+        """
+        One page of recordings (without segments) in manifest order. "next" is
+        the cursor for the following page's after=, or null on the last page.
+        """
+        try:
+            after = int(params["after"][0]) if "after" in params else None
+            limit = min(int(params.get("limit", [MANIFEST_PAGE])[0]), MANIFEST_PAGE_MAX)
+        except ValueError:
+            self.send_error(400, "Bad after or limit")
+            return
+        if limit < 1:
+            self.send_error(400, "Bad after or limit")
+            return
+        conn = segment_store.open_store()
+        try:
+            videos = segment_store.list_videos(conn, after=after, limit=limit + 1)
+        finally:
+            conn.close()
+        more = len(videos) > limit
+        videos = videos[:limit]
+        self.send_json({"videos": videos, "next": videos[-1]["position"] if more else None},
+                       validate=True)
+
+    def serve_manifest_video(self, video_id):
+        """One recording with its segments, in manifest.json format."""
+        conn = segment_store.open_store()
+        try:
+            video = segment_store.get_video(conn, video_id)
+        finally:
+            conn.close()
+        if video is None:
+            self.send_error(404, "Unknown video")
+            return
+        self.send_json(video, validate=True)
+
+    def serve_segments(self, params):
+        """Segments filtered by video_id, start/end (overlap, seconds) and group."""
+        try:
+            filters = {
+                "video_id": params.get("video_id", [None])[0],
+                "start": float(params["start"][0]) if "start" in params else None,
+                "end": float(params["end"][0]) if "end" in params else None,
+                "group": int(params["group"][0]) if "group" in params else None,
+            }
+        except ValueError:
+            self.send_error(400, "Bad filter value")
+            return
+        self.serve_store(segment_store.query_segments, **filters)
+
+    def serve_static(self, filepath, versioned=False):
+        if os.path.basename(filepath) == "sprite.jpg":
+            # Sprites are rebuilt in place; only a versioned URL may be cached forever
+            self.serve_path(filepath, cache_control=IMMUTABLE if versioned else REVALIDATE,
+                            data=read_sprite(filepath))
+        else:
+            self.serve_path(filepath, cache_control=IMMUTABLE)
+
     def serve_video_range(self, params):
         """Serve a 10s clip from a video, transcoded to mp4 for browser playback."""
         video_path = params.get("path", [None])[0]
         start = params.get("start", ["0"])[0]
         duration = params.get("duration", ["10"])[0]
+        priority = LOW if params.get("priority", [""])[0] == "low" else HIGH
 
         if not video_path or not os.path.exists(video_path):
             self.send_error(404, "Video not found")
             return
+        try:
+            if not (0 <= float(start) < float("inf") and 0 < float(duration) < float("inf")):
+                raise ValueError
+        except ValueError:
+            self.send_error(400, "Bad start or duration")
+            return
+
+        proxy_cmd = build_proxies.clip_cmd(video_path, start, duration)
+        if proxy_cmd:
+            # Stream copy of existing proxy segments: cheap enough to skip pool and cache
+            self.stream_process(proxy_cmd)
+            return
 
-        # Transcode the segment to mp4 for browser compatibility
-        cmd = [
-            "ffmpeg", "-v", "quiet",
-            "-ss", start, "-i", video_path, "-t", duration,
-            "-vf", "scale=1920:-1",
-            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "23",
-            "-c:a", "aac", "-movflags", "frag_keyframe+empty_moov",
-            "-f", "mp4", "pipe:1"
-        ]
-        result = subprocess.run(cmd, capture_output=True)
+        key = None
+        if preview_cache is not None:
+            key = preview_key(video_path, start, duration, PREVIEW_WIDTH)
+            if priority == HIGH:
+                with _prefetch_lock:
+                    inflight = _prefetching.get(key)
+                if inflight is not None:
+                    inflight.wait(PREFETCH_WAIT)  # already being prefetched
+            cached = preview_cache.get(key)
+            if cached:
+                if priority == HIGH:
+                    schedule_prefetch(video_path, start)
+                self.serve_path(cached, "video/mp4", PREVIEW_CACHE_CONTROL)
+                return
 
+        # Transcode the segment to fragmented mp4 for browser compatibility
+        cmd = transcode_cmd(video_path, start, duration)
+        try:
+            job = transcode_pool.acquire(priority, label=job_label(video_path, start))
+        except (PoolFull, Cancelled) as e:
+            self.send_response(503, "Transcode queue full" if isinstance(e, PoolFull) else "Cancelled")
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if priority == HIGH:
+            # After acquiring, so the neighbours queue behind this request
+            # rather than being cancelled by it
+            schedule_prefetch(video_path, start)
+
+        writer = preview_cache.writer(key) if key is not None else None
+        returncode = None
+        try:
+            returncode = self.stream_process(cmd, job, writer)
+        finally:
+            if writer is not None:
+                # A cancelled low-priority transcode exits non-zero and is not cached
+                if returncode == 0 and writer.size:
+                    writer.commit()
+                else:
+                    writer.abort()
+            transcode_pool.release(job)
+
+    def stream_process(self, cmd, job=None, writer=None):
+        """Run ffmpeg and stream its stdout to the client. Returns its exit code."""
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if job is not None:
+            job.attach(proc)
+        try:
+            self.stream_video(proc.stdout, writer)
+            proc.wait()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away (skipped to another segment)
+            self.close_connection = True
+        finally:
+            if proc.poll() is None:
+                proc.kill()  # stop ffmpeg for a client that is gone
+                proc.wait()
+            proc.stdout.close()
+        return proc.returncode
+
+    def stream_video(self, pipe, writer=None):
+        """Send fragmented mp4 from pipe with chunked transfer as ffmpeg produces it."""
         self.send_response(200)
         self.send_header("Content-Type", "video/mp4")
-        self.send_header("Content-Length", len(result.stdout))
+        self.send_header("Transfer-Encoding", "chunked")
         self.end_headers()
-        self.wfile.write(result.stdout)
+        fd = pipe.fileno()
+        while True:
+            chunk = os.read(fd, STREAM_CHUNK)
+            if not chunk:
+                break
+            if writer is not None:
+                writer.write(chunk)
+            self.write_chunk(chunk)
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        """Send one chunk of a chunked response; empty data ends the response."""
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
 
     def handle_export(self, body):
-        """Export selected segments as full-quality clips."""
-        selections = body.get("selections", [])
-        os.makedirs(EXPORT_DIR, exist_ok=True)
-
-        results = []
-        for sel in selections:
-            video_path = sel["path"]
-            start = sel["start"]
-            duration = sel["duration"]
-            video_id = sel["video_id"]
-            index = sel["index"]
-
-            out_name = f"{video_id}_seg{index:03d}.mp4"
-            out_path = os.path.join(EXPORT_DIR, out_name)
-
-            cmd = [
-                "ffmpeg", "-v", "quiet", "-y",
-                "-ss", str(start), "-i", video_path, "-t", str(duration),
-                "-c", "copy", out_path
-            ]
-            subprocess.run(cmd)
-            results.append({"file": out_name, "path": out_path})
-
-        response = json.dumps({"exported": results}).encode()
+        """Queue the selected segments for export as full-quality clips; answers with the job id."""
+        try:
+            job = export_jobs.submit(body.get("selections", []) if isinstance(body, dict) else None)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        self.send_json({"job_id": job.job_id, "total": job.total, "progress": f"/jobs/{job.job_id}"},
+                       status=202)
+
+    def stream_job(self, job_id):
+        """Stream an export job's progress events as NDJSON until it finishes."""
+        job = export_jobs.get(job_id)
+        if job is None:
+            self.send_error(404, "Unknown job")
+            return
         self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", len(response))
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Transfer-Encoding", "chunked")
         self.end_headers()
-        self.wfile.write(response)
+        try:
+            for event in job.follow():
+                self.write_chunk(json.dumps(event).encode() + b"\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the job keeps running without a listener
 
     def log_message(self, format, *args):
         if "/video" not in str(args):
@@ -128,11 +624,33 @@ class SegmentPickerHandler(http.server.BaseHTTPRequestHandler):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preview-cache-mb", type=float, default=DEFAULT_BUDGET_MB,
+                        help="disk budget for cached /video previews (0 disables the cache)")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="don't prefetch neighbouring segment previews")
+    parser.add_argument("--export-workers", type=int, default=2,
+                        help="clips to cut concurrently for /export jobs")
+    parser.add_argument("--transcodes", type=int, default=2,
+                        help="concurrent /video transcodes")
+    parser.add_argument("--transcode-queue", type=int, default=8,
+                        help="transcodes allowed to wait for a slot before answering 503")
+    args = parser.parse_args()
+    if args.preview_cache_mb > 0:
+        preview_cache = PreviewCache(budget_mb=args.preview_cache_mb)
+    transcode_pool = TranscodePool(args.transcodes, args.transcode_queue)
+    prefetch_enabled = not args.no_prefetch
+    export_jobs = ExportJobs(EXPORT_DIR, args.export_workers)
     os.chdir(BASE_DIR)
-    server = http.server.HTTPServer(("", PORT), SegmentPickerHandler)
+    server = http.server.ThreadingHTTPServer(("", PORT), SegmentPickerHandler)
+    server.daemon_threads = True
     print(f"Segment picker running at http://localhost:{PORT}")
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down.")
+        if preview_cache:
+            print(f"Preview cache: {preview_cache.stats()}")
+        print(f"Transcodes: {transcode_pool.stats()}")
         server.shutdown()
+        export_jobs.close()  # let queued cuts finish
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Persistent per-recording frame-signature store.
+
+The first scan of a recording saves its downscaled frames (the "signatures")
+as a .npy next to a small JSON sidecar recording the source path, size and
+mtime. Later scans memory-map the .npy instead of decoding the ProRes again,
+so changing loop parameters costs seconds rather than a full archive decode.
+
+Files live in signatures/ as <video_id>_<fps>fps_<w>x<h>.npy/.json.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+STORE_DIR = Path(__file__).parent / "signatures"
+
+
+def store_paths(source_path, fps, scale):
+    """(npy_path, sidecar_path) for a recording at a given fps and scale."""
+    video_id = Path(source_path).stem.replace(" ", "_")
+    w, h = scale
+    base = f"{video_id}_{fps:g}fps_{w}x{h}"
+    return STORE_DIR / f"{base}.npy", STORE_DIR / f"{base}.json"
+
+
+def source_key(source_path):
+    """Identity of a source file: absolute path, size and mtime."""
+    st = os.stat(source_path)
+    return {
+        "source_path": os.path.abspath(source_path),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+    }
+
+
+def _read_sidecar(sidecar):
+    try:
+        with open(sidecar) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_signatures(source_path, fps, scale):
+    """
+    Memory-map stored signatures for a recording, or None if there is no
+    store or the source file has changed since it was written.
+    Returns a read-only (n, h, w, 3) uint8 array.
+    """
+    npy_path, sidecar = store_paths(source_path, fps, scale)
+    meta = _read_sidecar(sidecar)
+    if meta is None or not npy_path.exists():
+        return None
+    try:
+        key = source_key(source_path)
+    except OSError:
+        return None
+    if any(meta.get(k) != v for k, v in key.items()):
+        return None
+    return np.load(npy_path, mmap_mode="r")
+
+
+def available_signatures(source_path):
+    """All valid stores for a recording as a list of (fps, (w, h), array)."""
+    video_id = Path(source_path).stem.replace(" ", "_")
+    found = []
+    for sidecar in sorted(STORE_DIR.glob(f"{video_id}_*fps_*.json")):
+        meta = _read_sidecar(sidecar)
+        if meta is None:
+            continue
+        scale = (meta["width"], meta["height"])
+        signatures = load_signatures(source_path, meta["fps"], scale)
+        if signatures is not None:
+            found.append((meta["fps"], scale, signatures))
+    return found
+
+
+def frame_at(signatures, fps, t):
+    """Stored frame nearest to time t (seconds)."""
+    return signatures[min(max(0, int(round(t * fps))), len(signatures) - 1)]
+
+
+def record_signatures(frames, source_path, fps, scale, min_frames=0):
+    """
+    Pass frames through unchanged while saving them to the store.
+
+    Frames are appended to a temporary raw file as they stream by; once the
+    stream is exhausted the .npy header is written and the store is moved into
+    place. Nothing is saved if the consumer stops early, the frame source
+    raises, or fewer than min_frames frames arrived (a truncated decode would
+    otherwise be keyed to the unchanged source and reused forever).
+    """
+    STORE_DIR.mkdir(exist_ok=True)
+    npy_path, sidecar = store_paths(source_path, fps, scale)
+    key = source_key(source_path)
+    w, h = scale
+    raw_tmp = npy_path.with_name(npy_path.name + ".raw.tmp")
+    npy_tmp = npy_path.with_name(npy_path.name + ".tmp")
+
+    n = 0
+    completed = False
+    try:
+        with open(raw_tmp, "wb") as raw:
+            for frame in frames:
+                raw.write(frame.tobytes())
+                n += 1
+                yield frame
+        completed = True
+    finally:
+        if completed and n > 0 and n < min_frames:
+            print(f"  Not storing signatures for {Path(source_path).name}: "
+                  f"{n} frames, expected {min_frames}", flush=True)
+        if completed and n > 0 and n >= min_frames:
+            header = {
+                "descr": np.lib.format.dtype_to_descr(np.dtype(np.uint8)),
+                "fortran_order": False,
+                "shape": (n, h, w, 3),
+            }
+            with open(npy_tmp, "wb") as out, open(raw_tmp, "rb") as raw:
+                np.lib.format.write_array_header_1_0(out, header)
+                while True:
+                    block = raw.read(1 << 24)
+                    if not block:
+                        break
+                    out.write(block)
+            sidecar.unlink(missing_ok=True)
+            os.replace(npy_tmp, npy_path)
+            with open(sidecar, "w") as f:
+                json.dump({**key, "fps": fps, "width": w, "height": h, "frames": n}, f, indent=2)
+        for tmp in (raw_tmp, npy_tmp):
+            if tmp.exists():
+                tmp.unlink()
@@ -6,6 +6,8 @@ import re
 from collections import defaultdict
 from datetime import datetime
 
+from poster_derivatives import load_index, poster_html
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 WEBSITE_DIR = os.path.join(os.path.dirname(os.path.dirname(BASE_DIR)), "website")
 CDN = "https://d2xbllb3qhv8ay.cloudfront.net"
@@ -99,11 +101,16 @@ def group_and_sort_clips(all_ids):
     return result
 
 
-def generate_page_html(page_num, clips, total_pages):
-    """Generate HTML for a browse page."""
+def generate_page_html(page_num, clips, total_pages, posters=None):
+    """Generate HTML for a browse page.
+
+    posters: poster_derivatives index; clips listed in it get AVIF/WebP srcsets.
+    """
+    posters = load_index() if posters is None else posters
+    onload = 'onload="this.closest(\'.clip\').classList.add(\'loaded\')"'
     clips_html = "\n".join(
         f'            <div class="clip" data-id="{cid}" data-src="{CDN}/video/{cid}.mp4#t=0.001">\n'
-        f'                <img src="{CDN}/posters/{cid}.jpg" alt="" onload="this.parentNode.classList.add(\'loaded\')">\n'
+        f'                {poster_html(cid, CDN, posters, onload)}\n'
         f'            </div>'
         for cid in clips
     )
@@ -191,6 +198,7 @@ def generate_page_html(page_num, clips, total_pages):
         }}
         .clip img {{
             width: 100%;
+            height: auto;
             display: block;
         }}
         .page-nav {{
@@ -412,8 +420,10 @@ def main():
     total_pages = len(sessions)
     print(f"\nGenerating {total_pages} pages...")
 
+    posters = load_index()
+    print(f"{len(posters)} posters have WebP/AVIF derivatives")
     for page_num, (key, label, clips) in enumerate(sessions, 1):
-        html = generate_page_html(page_num, clips, total_pages)
+        html = generate_page_html(page_num, clips, total_pages, posters)
         path = os.path.join(WEBSITE_DIR, f"clips-{page_num}.html")
         with open(path, "w") as f:
             f.write(html)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Bounded admission for ffmpeg transcodes in the segment picker server.
+
+Request threads stream their own ffmpeg output, so the pool does not run the
+work itself: a thread takes a slot before starting ffmpeg and gives it back
+when done. At most `workers` transcodes run at once and at most `max_queue`
+wait for a slot; beyond that acquire() raises PoolFull and the server answers
+503. Low-priority jobs (prefetches) never delay normal ones: a new normal
+request cancels every queued low-priority job and, if no slot is free, kills
+a running one.
+"""
+
+import itertools
+import threading
+
+HIGH = 0
+LOW = 1
+
+
+class PoolFull(Exception):
+    """The wait queue is at max_queue."""
+
+
+class Cancelled(Exception):
+    """A low-priority job was cancelled before it got a slot."""
+
+
+class Job:
+    """A queued or running transcode; cancel() kills its attached process."""
+
+    def __init__(self, priority, seq, label=None):
+        self.priority = priority
+        self.seq = seq
+        self.label = label
+        self.proc = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def attach(self, proc):
+        """Register the ffmpeg process so cancel() can stop it."""
+        self.proc = proc
+        if self.cancelled:
+            proc.kill()
+
+    def cancel(self):
+        self._cancelled.set()
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+
+
+class TranscodePool:
+    """At most `workers` concurrent transcodes and `max_queue` waiting ones."""
+
+    def __init__(self, workers=2, max_queue=8):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = set()
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _next_in_line(self):
+        return min(self._waiting, key=lambda j: (j.priority, j.seq))
+
+    def acquire(self, priority=HIGH, label=None):
+        """Wait for a slot and return the running Job. Raises PoolFull or Cancelled."""
+        with self._cond:
+            if priority == HIGH:
+                for job in self._waiting:
+                    if job.priority == LOW:
+                        job.cancel()
+                self._cond.notify_all()
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise PoolFull()
+            job = Job(priority, next(self._seq), label)
+            self._waiting.append(job)
+            try:
+                while True:
+                    if job.cancelled:
+                        self.cancelled += 1
+                        raise Cancelled()
+                    if len(self._running) < self.workers and self._next_in_line() is job:
+                        break
+                    if priority == HIGH and len(self._running) >= self.workers:
+                        # Free one slot, unless a cancelled job is already about to release
+                        low = [j for j in self._running if j.priority == LOW and not j.cancelled]
+                        if low and not any(j.cancelled for j in self._running):
+                            max(low, key=lambda j: j.seq).cancel()
+                            self.cancelled += 1
+                    self._cond.wait()
+            finally:
+                self._waiting.remove(job)
+                self._cond.notify_all()
+            self._running.add(job)
+            return job
+
+    def release(self, job):
+        with self._cond:
+            self._running.discard(job)
+            self.completed += 1
+            self._cond.notify_all()
+
+    def cancel_low(self, keep=None):
+        """Cancel queued and running low-priority jobs, except those keep(job) accepts."""
+        with self._cond:
+            for job in self._waiting + list(self._running):
+                if job.priority == LOW and not job.cancelled and not (keep and keep(job)):
+                    job.cancel()
+                    if job in self._running:
+                        self.cancelled += 1  # queued ones are counted when they wake
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+            }
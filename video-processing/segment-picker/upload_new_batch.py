@@ -17,6 +17,7 @@ TOP_N = 40
 MIN_SEPARATION = 15.0
 
 import requests
+from segment_selection import IntervalIndex, select_non_overlapping
 HEADERS = {"Authorization": f"bearer {TOKEN}"}
 
 
@@ -24,28 +25,13 @@ def select_top_n(n):
     with open(CACHE) as f:
         candidates = json.load(f)
 
-    existing = set()
     with open(EXISTING_RESULTS) as f:
-        for r in json.load(f):
-            existing.add((r["video_id"], round(r["loop_start"])))
-
-    by_video = {}
-    for c in candidates:
-        by_video.setdefault(c["video_id"], []).append(c)
-
-    selected = []
-    for vid, cands in by_video.items():
-        cands.sort(key=lambda c: (c["loop_score"], -c["visual_interest"]))
-        picked = []
-        for c in cands:
-            overlaps = any(abs(c["loop_start"] - p["loop_start"]) < MIN_SEPARATION for p in picked)
-            if not overlaps:
-                is_existing = any(c["video_id"] == ev and abs(c["loop_start"] - es) < MIN_SEPARATION for (ev, es) in existing)
-                if not is_existing:
-                    picked.append(c)
-        selected.extend(picked)
-
-    selected.sort(key=lambda c: c["loop_score"])
+        existing = IntervalIndex(
+            MIN_SEPARATION,
+            ((r["video_id"], round(r["loop_start"])) for r in json.load(f))
+        )
+
+    selected = select_non_overlapping(candidates, MIN_SEPARATION, exclude=existing)
     return selected[:n]
 
 
@@ -5,6 +5,13 @@ import os
 import sys
 from generate_edl import create_edl, seconds_to_timecode
 
+# Shared ffprobe metadata cache lives with the segment picker
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'segment-picker'))
+try:
+    from recording_catalog import get_catalog
+except ImportError:
+    get_catalog = None
+
 def detect_scenes_ffmpeg(video_path, threshold=0.3):
     """Use ffmpeg to detect scene changes"""
     print(f"\nAnalyzing: {video_path}")
@@ -38,7 +45,12 @@ def detect_scenes_ffmpeg(video_path, threshold=0.3):
     return sorted(timestamps)
 
 def get_video_duration(video_path):
-    """Get video duration using ffprobe"""
+    """Get video duration, from the shared recording catalog when available"""
+    if get_catalog is not None:
+        try:
+            return get_catalog().info(video_path)["duration"]
+        except RuntimeError:
+            pass  # ffprobe could not read it; fall through to the plain probe
     cmd = [
         'ffprobe',
         '-v', 'error',